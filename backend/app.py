@@ -9,18 +9,36 @@ import hashlib
 import hmac
 import os
 from fastapi import FastAPI
-from fastapi import Header, HTTPException, Request, Depends
+from fastapi import Header, HTTPException, Request, Depends, Response
 from fastapi.responses import JSONResponse
-from utils.whatsapp_utils import is_valid_whatsapp_message, process_whatsapp_message, send_message_to_admin
+from utils.whatsapp_utils import iter_webhook_messages, process_whatsapp_message, send_message_to_admin
+from utils.graph_client import graph_client
 from decorators.security import verify_signature
+from utils.webhook_payload import is_status_only, parse_body
 from fastapi import Request
 import re
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.sqlite.database import  get_db_h
+from database.sqlite.database import  get_db_h, get_db_ro, AsyncSessionLocal_h, AsyncSessionLocal_ro, init_db
 from database.sqlite.crud import  ChatHistoCRUD, ContactCRUD
-from typing import List
+from typing import List, Optional
 from database.sqlite.schemas import MessageOut, ToggleHumanChatPayload, MessagePayload
 from fastapi.middleware.cors import CORSMiddleware 
+from services.job_queue import JobQueue
+from services.coalescer import MessageCoalescer
+from services.context_store import context_store
+from services.dashscope_service import context_builder
+from database.sqlite.contact_cache import contact_cache
+from database.sqlite.writer import save_messages, group_writer
+from services.pubsub import broker, conversation_topic, CONTACTS_TOPIC
+from services.audio_workers import audio_pool
+from services.transcription import transcriber
+from services.media_cache import media_cache
+from services.response_cache import response_cache
+from services.metrics import RequestMetricsMiddleware, WEBHOOK_DELIVERIES, WEBHOOK_MESSAGES, render, stage
+from database.sqlite.message_dedupe import message_dedupe
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+import asyncio
 
 # Initialize FastAPI app
 app = FastAPI()
@@ -31,6 +49,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -38,9 +57,148 @@ load_dotenv()
 VERIFY_TOKEN    = os.getenv("VERIFY_TOKEN")
 APP_SECRET    = os.getenv("APP_SECRET")
 
+# Acknowledge-first mode: store the inbound message, return 200 and let the
+# reply workers handle transcription, generation and sending in the background.
+ASYNC_REPLIES = os.getenv("ASYNC_REPLIES", "0") == "1"
+
+# Message types the AI answers; anything else is stored but not answered
+SUPPORTED_MESSAGE_TYPES = ("text", "audio")
+
+
+
+async def persist_messages(db_h: AsyncSession, rows):
+    """Save CHAT_HISTO rows in one transaction and publish them to live subscribers."""
+    current_timestamp = datetime.now()
+    rows = [dict(row, TIMESTAMP=row.get("TIMESTAMP", current_timestamp)) for row in rows]
+    with stage("persist"):
+        ids = await save_messages(db_h, rows)
+    if ids is not None:
+        business = os.getenv("PHONE_NUMBER_ID")
+        for row, row_id in zip(rows, ids):
+            wa_id = row["RECEIVER"] if row["SENDER"] == business else row["SENDER"]
+            broker.publish(conversation_topic(wa_id), {
+                "type": "message",
+                "id": row_id,
+                "SENDER": row["SENDER"],
+                "RECEIVER": row["RECEIVER"],
+                "MESSAGE": row["MESSAGE"],
+                "TIMESTAMP": row["TIMESTAMP"].isoformat(),
+            })
+    return ids
+
+
+async def reply_with_ai(db_h: AsyncSession, message, name, SENDER, RECEIVER, message_body_type, pending=()):
+    """Generate and send the AI answer, then persist it together with the inbound message.
+
+    `pending` holds inbound CHAT_HISTO rows not stored yet; they are written in
+    the same transaction as the answer (and the audio transcription). If no
+    answer is produced they are not stored: the message's dedupe claim is
+    released and Meta's redelivery stores them with the answer, once.
+    """
+    rows = list(pending)
+    MESSAGE,  ANSWER = await process_whatsapp_message(message, name)
+
+    if message_body_type == "audio":
+        rows.append({"SENDER": SENDER, "RECEIVER": RECEIVER, "MESSAGE": MESSAGE})
+    rows.append({"SENDER": RECEIVER, "RECEIVER": SENDER, "MESSAGE": ANSWER})
+
+    insert_messages = await persist_messages(db_h, rows)
+    if insert_messages is None:
+        logging.error("Failed to insert the answer into the database.")
+        return JSONResponse(
+            {"status": "error", "message": "Failed to insert the answer into the database."}, status_code=500
+        )
+    return JSONResponse({"status": "ok"}, status_code=200)
+
+
+def merge_text_jobs(jobs):
+    """Fold consecutive text jobs of one contact into one job whose message joins their texts."""
+    merged = []
+    for job in jobs:
+        previous = merged[-1] if merged else None
+        if previous is not None and previous["message_body_type"] == "text" and job["message_body_type"] == "text":
+            text = previous["message"]["text"]["body"] + "\n" + job["message"]["text"]["body"]
+            merged[-1] = dict(
+                previous,
+                message=dict(previous["message"], text={"body": text}),
+                pending=list(previous["pending"]) + list(job["pending"]),
+            )
+        else:
+            merged.append(job)
+    return merged
+
+
+async def reply_batch(SENDER, jobs):
+    """Answer a contact's coalesced messages in order, with one turn per run of texts."""
+    response = None
+    async with AsyncSessionLocal_h() as db_h:
+        for job in merge_text_jobs(jobs):
+            response = await reply_with_ai(db_h, **job)
+            if response.status_code != 200:
+                break
+    return response
+
+
+reply_coalescer = MessageCoalescer(reply_batch, name="reply-coalescer")
+
+
+async def answer(db_h: AsyncSession, job):
+    """Reply to one message, merged with the contact's other recent messages when coalescing is on."""
+    if reply_coalescer.enabled:
+        return await reply_coalescer.submit(job["SENDER"], job)
+    return await reply_with_ai(db_h, **job)
+
+
+async def reply_job(job):
+    """Background worker entry point: runs the reply on its own DB session."""
+    async with AsyncSessionLocal_h() as db_h:
+        response = await answer(db_h, job)
+    if response.status_code != 200:
+        # The reply has already been sent at this point, so don't retry
+        logging.error(f"Background reply for {job['SENDER']} finished with status {response.status_code}")
+
+
+reply_queue = JobQueue(
+    reply_job,
+    workers=int(os.getenv("REPLY_WORKERS", "4")),
+    maxsize=int(os.getenv("REPLY_QUEUE_SIZE", "1000")),
+    max_retries=int(os.getenv("REPLY_MAX_RETRIES", "2")),
+    retry_delay=float(os.getenv("REPLY_RETRY_DELAY", "1.0")),
+    name="reply",
+)
+
+
+@app.on_event("startup")
+async def create_tables():
+    await init_db()
+
+
+@app.on_event("startup")
+async def start_reply_workers():
+    if ASYNC_REPLIES:
+        await reply_queue.start()
+
+
+@app.on_event("startup")
+async def warm_audio_workers():
+    audio_pool.warm_up()
+
 
+@app.on_event("shutdown")
+async def stop_reply_workers():
+    await reply_queue.stop()
+    await reply_coalescer.drain()
 
 
+@app.on_event("shutdown")
+async def close_graph_client():
+    await graph_client.aclose()
+
+
+@app.on_event("shutdown")
+async def stop_audio_workers():
+    audio_pool.shutdown()
+
 
 # Webhook verification (GET request)
 @app.get("/webhook")
@@ -62,6 +220,132 @@ async def verify_webhook(request: Request):
         raise HTTPException(status_code=403, detail="Verification failed")
 
 
+async def ingest_message(db_h, message, name, SENDER, RECEIVER, deferred_rows=None):
+    """Store an inbound message and answer it (inline or through the reply queue).
+
+    Messages that get no AI answer are appended to `deferred_rows`, when given,
+    for the caller to store in one transaction.
+    """
+    # Creates the contact on first contact; cached afterwards
+    with stage("contact_lookup"):
+        result = await ContactCRUD.get_contact_state(db_h, SENDER)
+    if result is None:
+        logging.error("Failed to insert new contact into the database.")
+        return JSONResponse(
+            {"status": "error", "message": "Failed to insert new contact"}, status_code=500
+        )
+    if result["CREATED"]:
+        # Lets live dashboards add the new conversation without waiting for a poll
+        broker.publish(CONTACTS_TOPIC, {
+            "type": "contact",
+            "PHONE_NUMBER": SENDER,
+            "AI_ACTIVE": result["AI_ACTIVE"],
+            "STATUS": result["STATUS"],
+            "CREATED": True,
+        })
+
+
+    message_body_type = message["type"]
+    if message_body_type not in SUPPORTED_MESSAGE_TYPES:
+        # Images, stickers, locations, reactions...: no AI answer, keep a placeholder in the conversation
+        logging.info(f"Storing unsupported {message_body_type} message from {SENDER} without an answer")
+        rows = [{"SENDER": SENDER, "RECEIVER": RECEIVER, "MESSAGE": f"[{message_body_type}]"}]
+        if deferred_rows is not None:
+            deferred_rows.extend(rows)
+            return None
+        if await persist_messages(db_h, rows) is None:
+            logging.error("Failed to insert new message into the database.")
+            return JSONResponse(
+                {"status": "error", "message": "Failed to insert new message"}, status_code=500
+            )
+        return JSONResponse({"status": "ok"}, status_code=200)
+
+    ai_active = result['AI_ACTIVE']==1 and result['STATUS']==1
+    pending = []
+    if message_body_type == "text":
+
+        MESSAGE= message["text"]["body"]
+        pending.append({"SENDER": SENDER, "RECEIVER": RECEIVER, "MESSAGE": MESSAGE})
+
+        if not ai_active and deferred_rows is not None:
+            deferred_rows.extend(pending)
+            return None
+
+        # Without an inline AI answer to batch it with, store the inbound message now
+        if not ai_active or ASYNC_REPLIES:
+            insert_message = await persist_messages(db_h, pending)
+            if insert_message is None:
+                logging.error("Failed to insert new message into the database.")
+                return JSONResponse(
+                    {"status": "error", "message": "Failed to insert new message"}, status_code=500
+                )
+            pending = []
+
+    if ai_active:
+        job = {
+            "message": message,
+            "name": name,
+            "SENDER": SENDER,
+            "RECEIVER": RECEIVER,
+            "message_body_type": message_body_type,
+            "pending": pending,
+        }
+        if ASYNC_REPLIES:
+            if reply_queue.enqueue(job):
+                return JSONResponse({"status": "ok"}, status_code=200)
+            logging.warning("Reply queue is full, answering inline.")
+
+        return await answer(db_h, job)
+
+
+async def ingest_contact_messages(db_h, SENDER, items, RECEIVER):
+    """Handle one contact's messages from a webhook delivery, in order.
+
+    Each message is claimed by id first so redeliveries are skipped; claims are
+    released again when the message could not be handled.
+    """
+    response = None
+    deferred_rows, deferred_ids = [], []
+    try:
+        for message, name in items:
+            message_id = message.get("id")
+            if message_id and not await message_dedupe.claim(db_h, message_id, SENDER, message.get("type")):
+                logging.info(f"Skipping redelivered message {message_id}")
+                continue
+
+            deferred = len(deferred_rows)
+            try:
+                response = await ingest_message(db_h, message, name, SENDER, RECEIVER, deferred_rows)
+            except Exception:
+                if message_id:
+                    await message_dedupe.release(db_h, message_id)
+                raise
+            if getattr(response, "status_code", 200) >= 500:
+                if message_id:
+                    await message_dedupe.release(db_h, message_id)
+                return response
+            if message_id and len(deferred_rows) > deferred:
+                deferred_ids.append(message_id)
+
+        if deferred_rows:
+            if await persist_messages(db_h, deferred_rows) is None:
+                logging.error("Failed to insert new messages into the database.")
+                return JSONResponse(
+                    {"status": "error", "message": "Failed to insert new messages"}, status_code=500
+                )
+            deferred_ids = []
+    finally:
+        # Messages whose rows were never stored must be handled again on redelivery
+        for message_id in deferred_ids:
+            await message_dedupe.release(db_h, message_id)
+    return response
+
+
+async def ingest_contact_messages_in_session(SENDER, items, RECEIVER):
+    async with AsyncSessionLocal_h() as db_h:
+        return await ingest_contact_messages(db_h, SENDER, items, RECEIVER)
+
+
 # Handle incoming messages (POST request)
 @app.post("/webhook")
 async def handle_message(request: Request, _=Depends(verify_signature),  db_h: AsyncSession = Depends(get_db_h)):
@@ -78,74 +362,57 @@ async def handle_message(request: Request, _=Depends(verify_signature),  db_h: A
         JSON response with status and appropriate HTTP status code.
     """
     try:
-        body = await request.json()
-        logging.info(f"Received body: {body}")
-
-        # Check if it's a WhatsApp status update
-        if (
-            body.get("entry", [{}])[0]
-            .get("changes", [{}])[0]
-            .get("value", {})
-            .get("statuses")
-        ):
-            logging.info("Received a WhatsApp status update.")
+        # Body bytes were read once by verify_signature
+        raw_body = request.state.raw_body
+
+        # Most deliveries are sent/delivered/read statuses: drop them without parsing
+        if is_status_only(raw_body):
+            WEBHOOK_DELIVERIES.labels("status").inc()
             return JSONResponse({"status": "ok"}, status_code=200)
-        
-        
-        # Validate and process WhatsApp messages
-        if is_valid_whatsapp_message(body):
 
-            message = body["entry"][0]["changes"][0]["value"]["messages"][0]
-            SENDER = message["from"]
-            RECEIVER =  os.getenv("PHONE_NUMBER_ID")
-            
-            exists = await ContactCRUD.phone_number_exists(db_h, SENDER)
-            if not exists:
-                # If the sender's phone number doesn't exist in the database, add it
-                new_contact = await ContactCRUD.add_contact(db_h, PHONE_NUMBER=SENDER, AI_ACTIVE=1, STATUS=1)
-                if new_contact is None:
-                    logging.error("Failed to insert new contact into the database.")
-                    return JSONResponse(
-                        {"status": "error", "message": "Failed to insert new contact"}, status_code=500
-                    )
+        body = parse_body(raw_body)
+        request.state.body = body
+        logging.debug("Received body: %s", raw_body)
 
-            result = await ContactCRUD.get_status_and_ai_active(db_h, SENDER)
+        # Validate and process WhatsApp messages; one delivery can batch several
+        messages = list(iter_webhook_messages(body))
+        if messages:
+            WEBHOOK_DELIVERIES.labels("message").inc()
+            for message, _ in messages:
+                WEBHOOK_MESSAGES.labels(message.get("type", "unknown")).inc()
+            RECEIVER =  os.getenv("PHONE_NUMBER_ID")
 
-        
-            message = body["entry"][0]["changes"][0]["value"]["messages"][0]
-            message_body_type = message["type"]
-            if message_body_type == "text":
-
-                MESSAGE= body["entry"][0]["changes"][0]["value"]["messages"][0]["text"]["body"]
-
-                insert_message = await ChatHistoCRUD.add_message(db_h, SENDER, RECEIVER, MESSAGE)
-
-            if result['AI_ACTIVE']==1 and result['STATUS']==1:
-
-                MESSAGE,  ANSWER =  process_whatsapp_message(body)
-                if message_body_type == "audio":
-                    insert_message = await ChatHistoCRUD.add_message(db_h, SENDER, RECEIVER, MESSAGE)
-
-                if insert_message is None:
-                        logging.error("Failed to insert new message into the database.")
-                        return JSONResponse(
-                            {"status": "error", "message": "Failed to insert new message"}, status_code=500
-                        )
-                else:
-                    insert_answer = await ChatHistoCRUD.add_message(db_h, RECEIVER, SENDER, ANSWER)
-                    if insert_answer is None:
-                        logging.error("Failed to insert the answer into the database.")
-                        return JSONResponse(
-                            {"status": "error", "message": "Failed to insert the answer into the database."}, status_code=500
-                        )
-                return JSONResponse({"status": "ok"}, status_code=200)
+            # In order per contact, concurrently across contacts
+            by_contact = {}
+            for message, name in messages:
+                by_contact.setdefault(message["from"], []).append((message, name))
+
+            if len(by_contact) == 1:
+                [(SENDER, items)] = by_contact.items()
+                return await ingest_contact_messages(db_h, SENDER, items, RECEIVER)
+
+            logging.info(f"Received {len(messages)} messages from {len(by_contact)} contacts in one delivery")
+            results = await asyncio.gather(*(
+                ingest_contact_messages_in_session(SENDER, items, RECEIVER) for SENDER, items in by_contact.items()
+            ))
+            for result in results:
+                if getattr(result, "status_code", 200) >= 500:
+                    # Meta redelivers the batch; messages already handled are skipped by id
+                    return result
+            return JSONResponse({"status": "ok"}, status_code=200)
+        elif b'"statuses"' in raw_body:
+            # Status updates the byte check could not rule out (no message was found)
+            WEBHOOK_DELIVERIES.labels("status").inc()
+            return JSONResponse({"status": "ok"}, status_code=200)
         else:
             # If it's not a valid WhatsApp API event, return error
+            WEBHOOK_DELIVERIES.labels("unknown").inc()
             return JSONResponse(
                 {"status": "error", "message": "Not a WhatsApp API event"}, status_code=404
             )
 
     except json.JSONDecodeError:
+        WEBHOOK_DELIVERIES.labels("invalid").inc()
         logging.error("Failed to decode JSON")
         return JSONResponse(
             {"status": "error", "message": "Invalid JSON provided"}, status_code=400
@@ -153,14 +420,25 @@ async def handle_message(request: Request, _=Depends(verify_signature),  db_h: A
     
 
 
+HISTORY_MAX_LIMIT = int(os.getenv("HISTORY_MAX_LIMIT", "500"))
+
+
 @app.post("/history", response_model=List[MessageOut])
-async def get_conversation(user_id: str, db: AsyncSession = Depends(get_db_h)):
+async def get_conversation(user_id: str, before: Optional[int] = None, after: Optional[int] = None,
+                           limit: Optional[int] = None, db: AsyncSession = Depends(get_db_ro)):
     """
-    Get full conversation history for a user (by phone or user_id).
+    Get conversation history for a user (by phone or user_id).
+
+    Without paging parameters the full conversation is returned. With `limit`, returns
+    the newest messages, or the page older than `before` / newer than `after` (message ids).
     """
-    conversation = await ChatHistoCRUD.get_chat_by_user(db, SENDER=user_id, RECEIVER=os.getenv("PHONE_NUMBER_ID"))
+    if limit is not None:
+        limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    conversation = await ChatHistoCRUD.get_chat_by_user(
+        db, SENDER=user_id, RECEIVER=os.getenv("PHONE_NUMBER_ID"), before=before, after=after, limit=limit
+    )
     
-    if not conversation:
+    if not conversation and before is None and after is None:
         raise HTTPException(status_code=404, detail="No conversation found for this user.")
 
     return conversation
@@ -168,6 +446,93 @@ async def get_conversation(user_id: str, db: AsyncSession = Depends(get_db_h)):
 
 
 
+@app.get("/history/updates", response_model=List[MessageOut])
+async def get_conversation_updates(user_id: str, request: Request, response: Response, after: Optional[int] = None,
+                                   limit: int = HISTORY_MAX_LIMIT, db: AsyncSession = Depends(get_db_ro)):
+    """
+    Get the messages of a conversation newer than message id `after` (the newest page if omitted).
+
+    The ETag is the id of the newest message, so a poll with a matching
+    If-None-Match gets 304 after a single index lookup.
+    """
+    RECEIVER = os.getenv("PHONE_NUMBER_ID")
+    last_id = await ChatHistoCRUD.get_last_message_id(db, user_id, RECEIVER)
+    if last_id is None:
+        raise HTTPException(status_code=500, detail="Failed to read the conversation.")
+
+    etag = f'"{last_id}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    messages = await ChatHistoCRUD.get_chat_by_user(db, SENDER=user_id, RECEIVER=RECEIVER, after=after, limit=limit)
+    response.headers["ETag"] = etag
+    return messages
+
+
+
+
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+
+def format_sse(event, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@app.get("/events")
+async def stream_events(request: Request, wa_id: Optional[str] = None):
+    """
+    Server-Sent Events for the dashboard.
+
+    Streams new messages of the conversation with `wa_id` and contact-state changes.
+    On reconnect, messages after the Last-Event-ID header are replayed first.
+    """
+    topics = [CONTACTS_TOPIC] + ([conversation_topic(wa_id)] if wa_id else [])
+    queue = broker.subscribe(*topics)
+    last_event_id = request.headers.get("last-event-id")
+
+    async def event_stream():
+        try:
+            if wa_id and last_event_id and last_event_id.isdigit():
+                async with AsyncSessionLocal_ro() as db:
+                    missed = await ChatHistoCRUD.get_chat_by_user(
+                        db, SENDER=wa_id, RECEIVER=os.getenv("PHONE_NUMBER_ID"),
+                        after=int(last_event_id), limit=HISTORY_MAX_LIMIT
+                    )
+                for msg in missed:
+                    yield format_sse({
+                        "type": "message",
+                        "id": msg.id,
+                        "SENDER": msg.SENDER,
+                        "RECEIVER": msg.RECEIVER,
+                        "MESSAGE": msg.MESSAGE,
+                        "TIMESTAMP": msg.TIMESTAMP.isoformat(),
+                    }, msg.id)
+
+            while not await request.is_disconnected():
+                try:
+                    topic, event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event, event.get("id"))
+        finally:
+            broker.unsubscribe(queue, *topics)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+
+
 @app.post("/sending")
 async def send_message_admin(payload: MessagePayload, db_h: AsyncSession = Depends(get_db_h)):
     try:
@@ -179,14 +544,14 @@ async def send_message_admin(payload: MessagePayload, db_h: AsyncSession = Depen
             return {"error": "Missing message or wa_id"}
         
         # Call the function to send the message to the admin (external service like WhatsApp)
-        send_message =  send_message_to_admin(payload.message, payload.wa_id)
+        send_message = await send_message_to_admin(payload.message, payload.wa_id)
         if send_message is None:
                     logging.error("Failed to insert new message into the database.")
                     return JSONResponse(
                         {"status": "error", "message": "Failed to insert new message"}, status_code=500
                     )
         else:
-            insert_answer = await ChatHistoCRUD.add_message(db_h, SENDER, RECEIVER, payload.message)
+            insert_answer = await persist_messages(db_h, [{"SENDER": SENDER, "RECEIVER": RECEIVER, "MESSAGE": payload.message}])
             if insert_answer is None:
                 logging.error("Failed to insert the answer into the database.")
                 return JSONResponse(
@@ -208,7 +573,7 @@ async def toggle_human_chat(payload: ToggleHumanChatPayload, db_h: AsyncSession
 
         new_ai_active_value = 0 if payload.activate else 1
 
-        update_result = await ContactCRUD.update_contact(
+        update_result, changed = await ContactCRUD.update_contact(
             db=db_h,
             PHONE_NUMBER=payload.wa_id,
             AI_ACTIVE=new_ai_active_value
@@ -220,9 +585,20 @@ async def toggle_human_chat(payload: ToggleHumanChatPayload, db_h: AsyncSession
                 status_code=404
             )
 
+        if changed:
+            contact_event = {
+                "type": "contact",
+                "PHONE_NUMBER": update_result.PHONE_NUMBER,
+                "AI_ACTIVE": update_result.AI_ACTIVE,
+                "STATUS": update_result.STATUS,
+            }
+            # Every /events client subscribes to CONTACTS_TOPIC, so one publish reaches them all
+            broker.publish(CONTACTS_TOPIC, contact_event)
+
         return {
             "status": "success",
             "message": "Human chat activated" if payload.activate else "AI reactivated",
+            "changed": changed,
             "contact": {
                 "PHONE_NUMBER": update_result.PHONE_NUMBER,
                 "AI_ACTIVE": update_result.AI_ACTIVE,
@@ -235,11 +611,45 @@ async def toggle_human_chat(payload: ToggleHumanChatPayload, db_h: AsyncSession
 
 
 @app.get("/contacts", response_model=list[str])
-async def read_contacts( db_h: AsyncSession = Depends(get_db_h)):
+async def read_contacts(request: Request, response: Response, db_h: AsyncSession = Depends(get_db_ro)):
+    version = await ContactCRUD.get_contacts_version(db_h)
+    if version is not None:
+        etag = '"{}-{}"'.format(version[0], version[1] or 0)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
     contacts = await ContactCRUD.get_all_contacts(db_h)
     return contacts or []
 
 
+@app.get("/metrics")
+async def read_metrics():
+    """Prometheus metrics: per-stage latencies, DB and outbound HTTP timings, token usage."""
+    content, media_type = render()
+    return Response(content=content, media_type=media_type)
+
+
+@app.get("/stats")
+async def read_stats():
+    """Runtime counters for the background workers."""
+    return {
+        "async_replies": ASYNC_REPLIES,
+        "reply_queue": reply_queue.stats(),
+        "reply_coalescer": reply_coalescer.stats(),
+        "context_store": context_store.stats(),
+        "context_builder": context_builder.stats(),
+        "response_cache": response_cache.stats(),
+        "contact_cache": contact_cache.stats(),
+        "message_dedupe": message_dedupe.stats(),
+        "group_writer": group_writer.stats(),
+        "audio_pool": audio_pool.stats(),
+        "transcription": transcriber.stats(),
+        "media_cache": media_cache.stats(),
+        "pubsub": broker.stats(),
+    }
+
+
 
 
 
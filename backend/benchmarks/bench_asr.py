@@ -0,0 +1,117 @@
+"""Compare speech recognition engines on a fixed corpus of voice notes.
+
+The corpus is a directory of OGG/Opus files; a `.txt` file with the same name
+holds the reference transcript and enables word error rate reporting. Each
+engine is warmed up first (model load is reported separately), then every note
+is transcribed sequentially for latency and with `--concurrency` threads for
+throughput.
+
+    cd backend && python benchmarks/bench_asr.py corpus/ --engines whisper,google --language en
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.asr_engines import ENGINES, get_engine
+from services.audio_pipeline import SAMPLE_RATE, SAMPLE_WIDTH, transcode_to_pcm
+
+
+def word_errors(reference, hypothesis):
+    """Word-level edit distance between two transcripts."""
+    ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    row = list(range(len(hyp) + 1))
+    for i, word in enumerate(ref, 1):
+        previous, row[0] = row[0], i
+        for j, other in enumerate(hyp, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (word != other))
+    return row[-1]
+
+
+def load_corpus(directory):
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.ogg"))):
+        with open(path, "rb") as f:
+            audio = f.read()
+        reference = None
+        if os.path.exists(path[:-4] + ".txt"):
+            with open(path[:-4] + ".txt", encoding="utf-8") as f:
+                reference = f.read().strip()
+        seconds = len(transcode_to_pcm(audio)) / (SAMPLE_RATE * SAMPLE_WIDTH)
+        corpus.append((os.path.basename(path), audio, reference, seconds))
+    return corpus
+
+
+def run_engine(name, corpus, language, concurrency):
+    engine = get_engine(name)
+    started = time.perf_counter()
+    engine.warm_up()
+    load_seconds = time.perf_counter() - started
+
+    latencies, errors, reference_words, failures = [], 0, 0, 0
+    for note, audio, reference, _ in corpus:
+        started = time.perf_counter()
+        try:
+            text = engine.transcribe(audio, language)
+        except ValueError as e:
+            print(f"  {name}: {note} failed ({e})")
+            failures += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+        if reference is not None:
+            errors += word_errors(reference, text)
+            reference_words += len(reference.split())
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda item: _safe_transcribe(engine, item[1], language), corpus))
+    throughput = len(corpus) / (time.perf_counter() - started)
+
+    audio_seconds = sum(item[3] for item in corpus)
+    if not latencies:
+        print(f"{name:>10}: every note failed")
+        return
+    latencies.sort()
+    wer = f"{errors / reference_words:6.1%}" if reference_words else "   n/a"
+    print(
+        f"{name:>10}: load {load_seconds:6.2f}s  p50 {statistics.median(latencies) * 1000:8.1f} ms  "
+        f"p95 {latencies[int(0.95 * (len(latencies) - 1))] * 1000:8.1f} ms  "
+        f"RTF {sum(latencies) / audio_seconds:5.2f}  {throughput:6.2f} notes/s @{concurrency}  "
+        f"WER {wer}  {failures} failed"
+    )
+
+
+def _safe_transcribe(engine, audio, language):
+    try:
+        return engine.transcribe(audio, language)
+    except ValueError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="directory of .ogg voice notes with optional .txt references")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        sys.exit(f"No .ogg files in {args.corpus}")
+    print(f"{len(corpus)} notes, {sum(item[3] for item in corpus):.1f}s of audio")
+
+    for name in args.engines.split(","):
+        try:
+            run_engine(name, corpus, args.language, args.concurrency)
+        except Exception as e:
+            print(f"{name:>10}: skipped ({e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Compare SQLite throughput of the previous database setup and the tuned one.
+
+Runs concurrent webhook-style writers (an inbound message and its answer)
+alongside dashboard-style readers polling a conversation, against a fresh
+database file for each configuration:
+
+    baseline  the setup before tuning: echo=True, one engine shared by reads and
+              writes, default pragmas, and each row saved by add_message with
+              its own commit and refresh
+    tuned     WAL and the other WRITE_PRAGMAS on the write engine, a separate
+              read-only engine, no echo, and both rows saved by add_messages in
+              one transaction
+
+The baseline's statement log goes to --echo-log (os.devnull by default), so it
+is still formatted and written but doesn't bury the results.
+
+    cd backend && python benchmarks/bench_sqlite.py --writers 20 --readers 20 --seconds 10
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database.sqlite.crud import ChatHistoCRUD
+from database.sqlite.pros_model import Base
+from database.sqlite.settings import READ_PRAGMAS, WRITE_PRAGMAS, apply_pragmas, database_url
+
+PHONE_NUMBER_ID = "business"
+
+
+def log_statements_to(path):
+    """Send echo=True output to `path`, formatted like SQLAlchemy's default stdout handler."""
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logging.getLogger("sqlalchemy.engine.Engine").addHandler(handler)
+
+
+async def run_config(name, tuned, writers, readers, seconds):
+    path = os.path.join(tempfile.mkdtemp(prefix="talktrace-bench-"), "bench.db")
+    if tuned:
+        write_engine = apply_pragmas(create_async_engine(database_url(path)), WRITE_PRAGMAS)
+        read_engine = apply_pragmas(create_async_engine(database_url(path, read_only=True)), READ_PRAGMAS)
+    else:
+        write_engine = read_engine = create_async_engine(database_url(path), echo=True)
+    async with write_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    write_sessions = sessionmaker(bind=write_engine, class_=AsyncSession, expire_on_commit=False)
+    read_sessions = sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False)
+
+    counts = {"writes": 0, "reads": 0, "locked": 0}
+    deadline = time.monotonic() + seconds
+
+    async def save_pair(db, wa_id):
+        inbound = {"SENDER": wa_id, "RECEIVER": PHONE_NUMBER_ID, "MESSAGE": "hello"}
+        answer = {"SENDER": PHONE_NUMBER_ID, "RECEIVER": wa_id, "MESSAGE": "hi, how can I help?"}
+        if tuned:
+            return await ChatHistoCRUD.add_messages(db, [inbound, answer]) is not None
+        # add_message returns None when the commit failed
+        return (await ChatHistoCRUD.add_message(db, **inbound) is not None
+                and await ChatHistoCRUD.add_message(db, **answer) is not None)
+
+    async def writer(i):
+        wa_id = f"wa{i % 10}"
+        while time.monotonic() < deadline:
+            try:
+                async with write_sessions() as db:
+                    saved = await save_pair(db, wa_id)
+                counts["writes" if saved else "locked"] += 1
+            except OperationalError:
+                counts["locked"] += 1
+
+    async def reader(i):
+        wa_id = f"wa{i % 10}"
+        while time.monotonic() < deadline:
+            try:
+                async with read_sessions() as db:
+                    await ChatHistoCRUD.get_chat_by_user(db, SENDER=wa_id, RECEIVER=PHONE_NUMBER_ID)
+                counts["reads"] += 1
+            except OperationalError:
+                counts["locked"] += 1
+
+    await asyncio.gather(*[writer(i) for i in range(writers)], *[reader(i) for i in range(readers)])
+    await write_engine.dispose()
+    if read_engine is not write_engine:
+        await read_engine.dispose()
+
+    print(
+        f"{name:>8}: {counts['writes'] / seconds:8.1f} write tx/s  "
+        f"{counts['reads'] / seconds:8.1f} reads/s  {counts['locked']} lock errors"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=10)
+    parser.add_argument("--readers", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--echo-log", default=os.devnull, help="where the baseline's statement log goes")
+    args = parser.parse_args()
+
+    log_statements_to(args.echo_log)
+    await run_config("baseline", False, args.writers, args.readers, args.seconds)
+    await run_config("tuned", True, args.writers, args.readers, args.seconds)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
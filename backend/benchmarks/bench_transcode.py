@@ -0,0 +1,84 @@
+"""Compare the OGG/Opus -> 16 kHz PCM transcoding backends.
+
+Decodes each voice note with every available backend (pydub needs the ffmpeg
+binary, opus needs libopus) and reports wall time per note, real-time factor
+and peak Python memory. Without files, a synthetic 30 s note is encoded with PyAV.
+
+    cd backend && python benchmarks/bench_transcode.py notes/*.ogg --repeat 20
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.audio_pipeline import BACKENDS, SAMPLE_RATE, SAMPLE_WIDTH, iter_pcm_chunks
+
+
+def synthetic_note(seconds):
+    """Encode a mono 48 kHz tone sweep as OGG/Opus, like a WhatsApp voice note."""
+    import av
+    import numpy as np
+
+    out = io.BytesIO()
+    with av.open(out, "w", format="ogg") as container:
+        stream = container.add_stream("libopus", rate=48000)
+        stream.layout = "mono"
+        t = np.arange(48000 * seconds) / 48000
+        samples = (np.sin(2 * np.pi * (200 + 100 * t) * t) * 8000).astype(np.int16)
+        for start in range(0, len(samples), 960):
+            frame = av.AudioFrame.from_ndarray(samples[None, start:start + 960], format="s16", layout="mono")
+            frame.sample_rate = 48000
+            frame.pts = start
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return out.getvalue()
+
+
+def run_backend(backend, notes, repeat):
+    pcm_bytes = 0
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for note in notes:
+            pcm_bytes += sum(len(chunk) for chunk in iter_pcm_chunks(note, backend))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    audio_seconds = pcm_bytes / (SAMPLE_RATE * SAMPLE_WIDTH)
+    print(
+        f"{backend:>6}: {elapsed / (repeat * len(notes)) * 1000:8.2f} ms/note  "
+        f"{audio_seconds / elapsed:8.1f}x real time  peak {peak / 1024:8.1f} KiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="OGG/Opus voice notes")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seconds", type=int, default=30, help="length of the synthetic note")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    args = parser.parse_args()
+
+    notes = []
+    for path in args.files:
+        with open(path, "rb") as f:
+            notes.append(f.read())
+    if not notes:
+        notes.append(synthetic_note(args.seconds))
+
+    for backend in args.backends.split(","):
+        try:
+            run_backend(backend, notes, args.repeat)
+        except Exception as e:
+            print(f"{backend:>6}: skipped ({e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Load test the backend's /webhook, /history and /contacts endpoints offline.
+
+Each endpoint is driven in turn by --concurrency clients for --seconds, and
+the p50/p99 latency, requests per second and status codes are reported. /webhook
+receives signed deliveries drawn from --mix (weights per kind: text, audio,
+status and batch). /history and /contacts then read what was written.
+
+With --spawn the mock Graph/DashScope server (benchmarks/mock_servers.py) and a
+backend on a throwaway database are started for the run. The backend inherits
+this environment, so settings such as ASYNC_REPLIES=1 or LLM_STREAM=1 can be
+compared between runs. Without --spawn, --url must point at a backend whose
+APP_SECRET is --secret.
+
+Audio deliveries are transcribed by the configured ASR engine. Only the whisper
+engine runs offline (e.g. ASR_ROUTES=en:whisper); with the others the
+transcription fails without network and the backend sends its fallback reply.
+
+    cd backend && python benchmarks/load_test.py --spawn --concurrency 20 --seconds 10 --mix text=5,status=20
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+from mock_servers import add_arguments as add_mock_arguments
+from webhook_payloads import contact_id, generate, signed
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MOCK_ARGUMENTS = ["graph_latency_ms", "media_latency_ms", "llm_latency_ms", "llm_token_ms", "jitter_ms",
+                  "error_rate", "note_seconds"]
+
+
+def parse_mix(mix):
+    """"text=5,status=20" -> ([kinds], [weights])."""
+    weights = {}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        weights[kind.strip()] = float(weight or 1)
+    return list(weights), list(weights.values())
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[2]} exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def spawn(args):
+    """Start the mock server and a backend pointed at it; returns (backend url, processes, temp dir)."""
+    directory = tempfile.mkdtemp(prefix="talktrace-load-")
+    mock_port, backend_port = free_port(), free_port()
+    mock_command = [sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "mock_servers.py"),
+                    "--port", str(mock_port)]
+    for name in MOCK_ARGUMENTS:
+        mock_command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    mock = subprocess.Popen(mock_command, cwd=BACKEND_DIR)
+
+    env = dict(
+        os.environ,
+        APP_SECRET=args.secret,
+        ACCESS_TOKEN="mock",
+        DASHSCOPE_API_KEY="mock",
+        PHONE_NUMBER_ID=os.environ.get("PHONE_NUMBER_ID", "100000000000001"),
+        VERSION=os.environ.get("VERSION", "v21.0"),
+        GRAPH_API_URL=f"http://127.0.0.1:{mock_port}",
+        GRAPH_HTTP2="0",
+        DASHSCOPE_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        DATABASE_PATH=os.path.join(directory, "talktrace.db"),
+        MEDIA_CACHE_DIR=os.path.join(directory, "media"),
+    )
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(backend_port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    processes = [backend, mock]
+    try:
+        wait_for_port(mock_port, mock)
+        wait_for_port(backend_port, backend)
+    except Exception:
+        stop(processes, directory)
+        raise
+    return f"http://127.0.0.1:{backend_port}", processes, directory
+
+
+def stop(processes, directory):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def webhook_request(args, contacts, kinds, weights):
+    raw, headers = signed(generate(random.choices(kinds, weights)[0], contacts), args.secret)
+    return "POST", "/webhook", {"content": raw, "headers": headers}
+
+
+def history_request(args, contacts, kinds, weights):
+    params = {"user_id": random.choice(contacts)}
+    if args.history_limit:
+        params["limit"] = args.history_limit
+    return "POST", "/history", {"params": params}
+
+
+def contacts_request(args, contacts, kinds, weights):
+    return "GET", "/contacts", {}
+
+
+REQUESTS = {"webhook": webhook_request, "history": history_request, "contacts": contacts_request}
+
+
+async def run_endpoint(client, endpoint, args, contacts, kinds, weights):
+    latencies, statuses = [], Counter()
+    deadline = time.monotonic() + args.seconds
+
+    async def worker():
+        while time.monotonic() < deadline:
+            method, url, kwargs = REQUESTS[endpoint](args, contacts, kinds, weights)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        print(f"{endpoint:>9}: no requests completed")
+        return
+    codes = " ".join(f"{code}x{count}" for code, count in sorted(statuses.items(), key=str))
+    print(
+        f"{endpoint:>9}: {len(latencies) / elapsed:8.1f} req/s  "
+        f"p50 {percentile(latencies, 0.50) * 1000:8.1f} ms  p99 {percentile(latencies, 0.99) * 1000:8.1f} ms  "
+        f"({len(latencies)} requests; {codes})"
+    )
+
+
+async def main(args):
+    kinds, weights = parse_mix(args.mix)
+    contacts = [contact_id(i) for i in range(args.contacts)]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        for endpoint in args.endpoints.split(","):
+            await run_endpoint(client, endpoint.strip(), args, contacts, kinds, weights)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="backend to load (ignored with --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="start the mock server and a backend for the run")
+    parser.add_argument("--secret", default=os.getenv("APP_SECRET") or "bench-secret")
+    parser.add_argument("--endpoints", default="webhook,history,contacts")
+    parser.add_argument("--mix", default="text=4,status=12,batch=1,audio=1")
+    parser.add_argument("--contacts", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=10, help="per endpoint")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--history-limit", type=int, default=50, help="page size for /history (0 = full history)")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    processes = []
+    if args.spawn:
+        args.url, processes, directory = spawn(args)
+    try:
+        asyncio.run(main(args))
+    finally:
+        if processes:
+            stop(processes, directory)
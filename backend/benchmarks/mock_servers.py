@@ -0,0 +1,167 @@
+"""Local stand-ins for the Graph API and DashScope's OpenAI-compatible endpoint.
+
+Serves, on one port, everything the backend calls while handling webhooks:
+
+    POST /{version}/{phone_number_id}/messages   send a message
+    GET  /{version}/{media_id}                    resolve a media id to its download URL
+    GET  /media/{media_id}                        download the voice note (synthetic OGG/Opus)
+    POST /v1/chat/completions                     chat completion, streamed or not, with usage
+
+Each endpoint waits a configurable latency (plus uniform jitter) before answering,
+and --error-rate makes that share of requests fail with 503. Point the backend at it with
+
+    GRAPH_API_URL=http://127.0.0.1:8900 DASHSCOPE_BASE_URL=http://127.0.0.1:8900/v1
+
+    cd backend && python benchmarks/mock_servers.py --llm-latency-ms 800 --graph-latency-ms 80
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from bench_transcode import synthetic_note
+
+MOCK_ANSWER = "Thanks for your message! Our opening hours are 9:00 to 17:00, Monday to Friday."
+
+
+def create_app(graph_latency_ms=50, media_latency_ms=100, llm_latency_ms=500, llm_token_ms=20,
+               jitter_ms=0, error_rate=0.0, note_seconds=5):
+    """Build the mock app; latencies are in milliseconds."""
+    app = FastAPI()
+    note = synthetic_note(note_seconds)
+    ids = itertools.count(1)
+    counts = {"messages": 0, "media": 0, "downloads": 0, "completions": 0, "errors": 0}
+
+    async def delay(milliseconds):
+        await asyncio.sleep((milliseconds + random.uniform(0, jitter_ms)) / 1000)
+
+    def failed():
+        if error_rate and random.random() < error_rate:
+            counts["errors"] += 1
+            return JSONResponse({"error": {"message": "mock overload", "code": 503}}, status_code=503)
+        return None
+
+    @app.get("/mock/stats")
+    async def mock_stats():
+        return counts
+
+    @app.get("/media/{media_id}")
+    async def download_media(media_id: str):
+        await delay(media_latency_ms)
+        counts["downloads"] += 1
+        return failed() or Response(note, media_type="audio/ogg")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await delay(llm_latency_ms)
+        error = failed()
+        if error is not None:
+            return error
+        counts["completions"] += 1
+
+        created = int(time.time())
+        completion_id = f"chatcmpl-mock-{next(ids)}"
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        words = MOCK_ANSWER.split(" ")[:body.get("max_tokens") or None]
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words)}
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(words)}}],
+                "usage": usage,
+            }
+
+        def chunk(delta, finish_reason=None, usage=None):
+            payload = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                "model": body.get("model"),
+                "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage:
+                payload["usage"] = usage
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            for i, word in enumerate(words):
+                if i:
+                    await delay(llm_token_ms)
+                yield chunk({"role": "assistant", "content": word if i == 0 else " " + word})
+            yield chunk({}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk({}, usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/{version}/{phone_number_id}/messages")
+    async def send_message(version: str, phone_number_id: str, request: Request):
+        body = await request.json()
+        await delay(graph_latency_ms)
+        error = failed()
+        if error is not None:
+            return error
+        counts["messages"] += 1
+        return {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": body.get("to"), "wa_id": body.get("to")}],
+            "messages": [{"id": f"wamid.mock{next(ids)}"}],
+        }
+
+    @app.get("/{version}/{media_id}")
+    async def media_url(version: str, media_id: str, request: Request):
+        await delay(graph_latency_ms)
+        error = failed()
+        if error is not None:
+            return error
+        counts["media"] += 1
+        return {
+            "messaging_product": "whatsapp",
+            "url": str(request.base_url) + f"media/{media_id}",
+            "mime_type": "audio/ogg; codecs=opus",
+            "file_size": len(note),
+            "id": media_id,
+        }
+
+    return app
+
+
+def add_arguments(parser):
+    parser.add_argument("--graph-latency-ms", type=float, default=50, help="Graph API send and media lookups")
+    parser.add_argument("--media-latency-ms", type=float, default=100, help="media downloads")
+    parser.add_argument("--llm-latency-ms", type=float, default=500, help="until the first token")
+    parser.add_argument("--llm-token-ms", type=float, default=20, help="between streamed tokens")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="uniform random extra latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--note-seconds", type=float, default=5, help="length of the synthetic voice note")
+
+
+def app_from_args(args):
+    return create_app(args.graph_latency_ms, args.media_latency_ms, args.llm_latency_ms, args.llm_token_ms,
+                      args.jitter_ms, args.error_rate, args.note_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(app_from_args(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Signed WhatsApp webhook deliveries for load tests.
+
+Builds the payloads Meta sends (text and audio messages, sent/delivered/read
+statuses, and deliveries batching several messages) and signs them with
+APP_SECRET the way verify_signature expects.
+
+    cd backend && python benchmarks/webhook_payloads.py audio --secret s3cret > body.json
+    curl -H "Content-Type: application/json" -H "X-Hub-Signature-256: <printed signature>" \
+        --data-binary @body.json http://127.0.0.1:8000/webhook
+"""
+import argparse
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import sys
+import time
+
+PHONE_NUMBER_ID = "100000000000001"
+TEXTS = [
+    "Hi, what are your opening hours?",
+    "Do you deliver on weekends?",
+    "How much is shipping to Casablanca?",
+    "I want to change my order",
+    "Thanks!",
+]
+
+_ids = itertools.count(1)
+
+
+def message_id():
+    """A unique wamid, so the backend's redelivery check never drops generated messages."""
+    return f"wamid.bench{time.time_ns()}{next(_ids)}"
+
+
+def contact_id(index):
+    return f"2126000{index:05d}"
+
+
+def text_message(wa_id, body=None):
+    return {
+        "from": wa_id, "id": message_id(), "timestamp": str(int(time.time())),
+        "type": "text", "text": {"body": body or random.choice(TEXTS)},
+    }
+
+
+def audio_message(wa_id, media_id=None):
+    return {
+        "from": wa_id, "id": message_id(), "timestamp": str(int(time.time())),
+        "type": "audio", "audio": {"id": media_id or f"media{next(_ids)}", "mime_type": "audio/ogg; codecs=opus"},
+    }
+
+
+def status(wa_id, state="delivered"):
+    return {
+        "id": message_id(), "status": state, "timestamp": str(int(time.time())), "recipient_id": wa_id,
+    }
+
+
+def delivery(messages=(), statuses=()):
+    """Wrap messages and statuses in a webhook delivery envelope."""
+    value = {
+        "messaging_product": "whatsapp",
+        "metadata": {"display_phone_number": "15550000000", "phone_number_id": PHONE_NUMBER_ID},
+    }
+    if messages:
+        wa_ids = dict.fromkeys(message["from"] for message in messages)
+        value["contacts"] = [{"profile": {"name": f"Bench {wa_id[-4:]}"}, "wa_id": wa_id} for wa_id in wa_ids]
+        value["messages"] = list(messages)
+    if statuses:
+        value["statuses"] = list(statuses)
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"id": "0", "changes": [{"value": value, "field": "messages"}]}],
+    }
+
+
+def text_delivery(wa_id, body=None):
+    return delivery([text_message(wa_id, body)])
+
+
+def audio_delivery(wa_id, media_id=None):
+    return delivery([audio_message(wa_id, media_id)])
+
+
+def status_delivery(wa_id):
+    return delivery(statuses=[status(wa_id, random.choice(["sent", "delivered", "read"]))])
+
+
+def batch_delivery(wa_ids, per_contact=2):
+    """Several text messages from each of `wa_ids` in one delivery."""
+    return delivery([text_message(wa_id) for wa_id in wa_ids for _ in range(per_contact)])
+
+
+def sign(raw, secret):
+    """X-Hub-Signature-256 header value for the raw body."""
+    return "sha256=" + hmac.new(secret.encode("latin-1"), raw, hashlib.sha256).hexdigest()
+
+
+def signed(payload, secret):
+    """Body bytes and headers for POST /webhook."""
+    raw = json.dumps(payload).encode()
+    return raw, {"Content-Type": "application/json", "X-Hub-Signature-256": sign(raw, secret)}
+
+
+KINDS = {
+    "text": lambda contacts: text_delivery(random.choice(contacts)),
+    "audio": lambda contacts: audio_delivery(random.choice(contacts)),
+    "status": lambda contacts: status_delivery(random.choice(contacts)),
+    "batch": lambda contacts: batch_delivery(random.sample(contacts, min(3, len(contacts)))),
+}
+
+
+def generate(kind, contacts):
+    """A random delivery of `kind` from one of `contacts`."""
+    return KINDS[kind](contacts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kind", choices=sorted(KINDS))
+    parser.add_argument("--secret", required=True, help="APP_SECRET of the backend")
+    parser.add_argument("--contacts", type=int, default=10)
+    args = parser.parse_args()
+
+    # The signature covers these exact bytes, so the body is printed as is
+    raw, headers = signed(generate(args.kind, [contact_id(i) for i in range(args.contacts)]), args.secret)
+    print(f"X-Hub-Signature-256: {headers['X-Hub-Signature-256']}", file=sys.stderr)
+    sys.stdout.write(raw.decode())
+
+
+if __name__ == "__main__":
+    main()
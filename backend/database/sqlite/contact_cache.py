@@ -0,0 +1,44 @@
+import os
+import time
+from collections import OrderedDict
+
+CONTACT_CACHE_SIZE = int(os.getenv("CONTACT_CACHE_SIZE", "10000"))
+CONTACT_CACHE_TTL = float(os.getenv("CONTACT_CACHE_TTL", "30"))  # seconds; bounds staleness across processes
+
+
+class ContactStateCache:
+    """In-process LRU of {"STATUS", "AI_ACTIVE"} per phone number."""
+
+    def __init__(self, maxsize=CONTACT_CACHE_SIZE, ttl=CONTACT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # phone number -> (expires_at, state)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, phone_number):
+        entry = self._entries.get(phone_number)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(phone_number, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(phone_number)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, phone_number, state):
+        if self.maxsize <= 0:
+            return
+        self._entries[phone_number] = (time.monotonic() + self.ttl, dict(state))
+        self._entries.move_to_end(phone_number)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, phone_number):
+        self._entries.pop(phone_number, None)
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+contact_cache = ContactStateCache()
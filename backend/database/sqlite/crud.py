@@ -1,7 +1,9 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import distinct, update
-from database.sqlite.pros_model import  CHAT_HISTO, CONTACT
+from sqlalchemy import distinct, update, insert, delete, func, or_
+from database.sqlite.pros_model import  CHAT_HISTO, CONTACT, CHAT_CONTEXT, CHAT_SUMMARY, PROCESSED_MESSAGE, conversation_key
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database.sqlite.contact_cache import contact_cache
 from sqlalchemy.exc import SQLAlchemyError 
 from datetime import datetime
 import os
@@ -38,37 +40,52 @@ class ContactCRUD:
     
     @staticmethod
     async def update_contact(db: AsyncSession, PHONE_NUMBER: str, AI_ACTIVE: int = None, STATUS: int = None):
-        """Update an existing contact's AI_ACTIVE, STATUS or other fields."""
+        """Update an existing contact's AI_ACTIVE, STATUS or other fields.
+
+        The row is only written (and DM bumped) when a value actually changes.
+        Returns (contact, changed); contact is None if not found or on error.
+        """
         current_timestamp = datetime.now()
         try:
-            update_values = {"DM": current_timestamp}  # Always update DM timestamp
-            
+            update_values = {"DM": current_timestamp}  # DM only moves when something changes
+            changes = []
+
             if AI_ACTIVE is not None:
                 update_values["AI_ACTIVE"] = AI_ACTIVE
+                changes.append(CONTACT.AI_ACTIVE.is_distinct_from(AI_ACTIVE))
             if STATUS is not None:
                 update_values["STATUS"] = STATUS
+                changes.append(CONTACT.STATUS.is_distinct_from(STATUS))
 
-            stmt = (
-                update(CONTACT)
-                .where(CONTACT.PHONE_NUMBER == PHONE_NUMBER)
-                .values(update_values)
-                .execution_options(synchronize_session="fetch")
+            changed = False
+            if changes:
+                stmt = (
+                    update(CONTACT)
+                    .where(CONTACT.PHONE_NUMBER == PHONE_NUMBER, or_(*changes))
+                    .values(update_values)
+                    .execution_options(synchronize_session="fetch")
+                )
+                result = await db.execute(stmt)
+                changed = result.rowcount > 0
+                if changed:
+                    await db.commit()
+                    contact_cache.invalidate(PHONE_NUMBER)
+                else:
+                    await db.rollback()  # nothing written, skip the commit
+
+            # Return the (possibly unchanged) contact
+            updated_contact = await db.execute(
+                select(CONTACT).filter_by(PHONE_NUMBER=PHONE_NUMBER)
             )
-            result = await db.execute(stmt)
-            await db.commit()
-            
-            if result.rowcount == 0:
+            contact = updated_contact.scalar_one_or_none()
+            if contact is None:
                 print(f"No contact found with phone number {PHONE_NUMBER}")
-                return None
-            else:
-                # Return the updated contact
-                updated_contact = await db.execute(
-                    select(CONTACT).filter_by(PHONE_NUMBER=PHONE_NUMBER)
-                )
-                return updated_contact.scalar_one_or_none()
+            return contact, changed
         except SQLAlchemyError as e:
+            await db.rollback()
             print(f"An error occurred while updating contact: {e}")
-            return None
+            return None, False
+
     @staticmethod
     async def get_all_contacts(db: AsyncSession):
         """Retrieve all phone numbers from the DB"""
@@ -89,6 +106,65 @@ class ContactCRUD:
             print(f"An error occurred while checking if phone number exists: {e}")
             return False
     @staticmethod
+    async def upsert_contact(db: AsyncSession, PHONE_NUMBER: str, AI_ACTIVE: int = 1, STATUS: int = 1):
+        """Insert the contact if it is new and return its {"STATUS", "AI_ACTIVE", "CREATED"}, or None on error"""
+        current_timestamp = datetime.now()
+        try:
+            result = await db.execute(
+                sqlite_insert(CONTACT)
+                .values(
+                    PHONE_NUMBER=PHONE_NUMBER,
+                    AI_ACTIVE=AI_ACTIVE,
+                    STATUS=STATUS,
+                    DC=current_timestamp,
+                    DM=current_timestamp
+                )
+                .on_conflict_do_nothing(index_elements=[CONTACT.PHONE_NUMBER])
+                .returning(CONTACT.STATUS, CONTACT.AI_ACTIVE)
+            )
+            contact = result.one_or_none()
+            await db.commit()
+            created = contact is not None
+            if contact is None:
+                # Existing contact: nothing was written, read its current state
+                result = await db.execute(
+                    select(CONTACT.STATUS, CONTACT.AI_ACTIVE).filter(CONTACT.PHONE_NUMBER == PHONE_NUMBER)
+                )
+                contact = result.one_or_none()
+                if contact is None:
+                    return None
+            return {"STATUS": contact[0], "AI_ACTIVE": contact[1], "CREATED": created}
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"An error occurred while upserting contact: {e}")
+            return None
+
+    @staticmethod
+    async def get_contact_state(db: AsyncSession, PHONE_NUMBER: str):
+        """Get {"STATUS", "AI_ACTIVE", "CREATED"} for a sender, creating the contact on first contact.
+
+        CREATED is True only for the call that inserted the contact. Served from
+        the in-process contact cache when possible.
+        """
+        state = contact_cache.get(PHONE_NUMBER)
+        if state is not None:
+            return dict(state, CREATED=False)
+        state = await ContactCRUD.upsert_contact(db, PHONE_NUMBER)
+        if state is not None:
+            contact_cache.set(PHONE_NUMBER, {"STATUS": state["STATUS"], "AI_ACTIVE": state["AI_ACTIVE"]})
+        return state
+
+    @staticmethod
+    async def get_contacts_version(db: AsyncSession):
+        """Cheap version tag of the contact list: (count, highest ID)"""
+        try:
+            result = await db.execute(select(func.count(CONTACT.ID), func.max(CONTACT.ID)))
+            return tuple(result.one())
+        except SQLAlchemyError as e:
+            print(f"An error occurred while retrieving contacts: {e}")
+            return None
+
+    @staticmethod
     async def get_status_and_ai_active(db: AsyncSession, PHONE_NUMBER: str):
         """Get the STATUS and AI_ACTIVE values for a given phone number."""
         try:
@@ -120,7 +196,8 @@ class ChatHistoCRUD:
                 SENDER=SENDER,
                 RECEIVER=RECEIVER,
                 MESSAGE=MESSAGE,
-                TIMESTAMP=current_timestamp
+                TIMESTAMP=current_timestamp,
+                CONVERSATION=conversation_key(SENDER, RECEIVER)
             )
             db.add(new_msg)
             await db.commit()
@@ -131,15 +208,57 @@ class ChatHistoCRUD:
             return None
 
     @staticmethod
-    async def get_chat_by_user(db: AsyncSession, SENDER: str, RECEIVER: str):
-        """Get all messages by user ID"""
+    async def add_messages(db: AsyncSession, messages: list[dict]):
+        """Add several {"SENDER", "RECEIVER", "MESSAGE"} rows in one transaction, without refreshing them.
+
+        Returns the new ids in order, or None on failure.
+        """
+        current_timestamp = datetime.now()
         try:
             result = await db.execute(
-                select(CHAT_HISTO).where(
-                    ((CHAT_HISTO.SENDER == SENDER) & (CHAT_HISTO.RECEIVER == RECEIVER))
-                    | ((CHAT_HISTO.SENDER == RECEIVER) & (CHAT_HISTO.RECEIVER == SENDER)) 
-                ).order_by(CHAT_HISTO.TIMESTAMP)
+                insert(CHAT_HISTO).returning(CHAT_HISTO.id, sort_by_parameter_order=True),
+                [
+                    dict(
+                        m,
+                        TIMESTAMP=m.get("TIMESTAMP", current_timestamp),
+                        CONVERSATION=conversation_key(m["SENDER"], m["RECEIVER"]),
+                    )
+                    for m in messages
+                ],
             )
+            ids = result.scalars().all()
+            await db.commit()
+            return ids
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"An error occurred while saving conversation: {e}")
+            return None
+
+    @staticmethod
+    async def get_chat_by_user(db: AsyncSession, SENDER: str, RECEIVER: str,
+                               before: int = None, after: int = None, limit: int = None):
+        """Get messages between two numbers, oldest first.
+
+        Keyset pagination on id: `after` returns the `limit` messages following that id,
+        otherwise the `limit` newest messages (older than `before` if given).
+        Without a limit the whole conversation is returned.
+        """
+        try:
+            stmt = select(CHAT_HISTO).where(CHAT_HISTO.CONVERSATION == conversation_key(SENDER, RECEIVER))
+            if before is not None:
+                stmt = stmt.where(CHAT_HISTO.id < before)
+            if after is not None:
+                stmt = stmt.where(CHAT_HISTO.id > after)
+
+            if after is None and limit is not None:
+                # Newest page first from the index, then flip back to chronological order
+                result = await db.execute(stmt.order_by(CHAT_HISTO.id.desc()).limit(limit))
+                return list(reversed(result.scalars().all()))
+
+            stmt = stmt.order_by(CHAT_HISTO.id)
+            if limit is not None:
+                stmt = stmt.limit(limit)
+            result = await db.execute(stmt)
             return result.scalars().all()
         except SQLAlchemyError as e:
             print(f"An error occurred while fetching conversation: {e}")
@@ -147,6 +266,18 @@ class ChatHistoCRUD:
         
 
     
+    @staticmethod
+    async def get_last_message_id(db: AsyncSession, SENDER: str, RECEIVER: str):
+        """Get the id of the newest message between two numbers (0 if none)"""
+        try:
+            result = await db.execute(
+                select(func.max(CHAT_HISTO.id)).where(CHAT_HISTO.CONVERSATION == conversation_key(SENDER, RECEIVER))
+            )
+            return result.scalar() or 0
+        except SQLAlchemyError as e:
+            print(f"An error occurred while fetching conversation: {e}")
+            return None
+
     @staticmethod
     async def get_all_senders(db: AsyncSession) -> list[str]:
         """Get a list of all distinct senders (user IDs)"""
@@ -163,7 +294,174 @@ class ChatHistoCRUD:
             return []
 
 
+class ChatContextCRUD:
+    @staticmethod
+    async def append_messages(db: AsyncSession, WA_ID: str, messages: list[dict]):
+        """Append context messages ({"role", "content", "tokens"}) for a contact in one transaction.
+
+        Returns the new row ids in order, or None on failure.
+        """
+        current_timestamp = datetime.now()
+        try:
+            result = await db.execute(
+                insert(CHAT_CONTEXT).returning(CHAT_CONTEXT.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "WA_ID": WA_ID,
+                        "ROLE": m["role"],
+                        "CONTENT": m["content"],
+                        "TOKENS": m.get("tokens", 0),
+                        "TIMESTAMP": current_timestamp,
+                    }
+                    for m in messages
+                ],
+            )
+            ids = result.scalars().all()
+            await db.commit()
+            return ids
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"An error occurred while saving chat context: {e}")
+            return None
+
+    @staticmethod
+    async def get_recent(db: AsyncSession, WA_ID: str, max_turns: int = None, max_tokens: int = None):
+        """Get the newest context messages for a contact, oldest first, within a turn and token limit"""
+        try:
+            running = (
+                select(
+                    CHAT_CONTEXT.id,
+                    CHAT_CONTEXT.ROLE,
+                    CHAT_CONTEXT.CONTENT,
+                    CHAT_CONTEXT.TOKENS,
+                    func.sum(CHAT_CONTEXT.TOKENS).over(order_by=CHAT_CONTEXT.id.desc()).label("RUNNING"),
+                )
+                .where(CHAT_CONTEXT.WA_ID == WA_ID)
+                .order_by(CHAT_CONTEXT.id.desc())
+            )
+            if max_turns is not None:
+                running = running.limit(max_turns)
+            running = running.subquery()
+
+            stmt = select(running.c.id, running.c.ROLE, running.c.CONTENT, running.c.TOKENS)
+            if max_tokens is not None:
+                stmt = stmt.where(running.c.RUNNING <= max_tokens)
+            result = await db.execute(stmt.order_by(running.c.id))
+            return [
+                {"id": row.id, "role": row.ROLE, "content": row.CONTENT, "tokens": row.TOKENS}
+                for row in result
+            ]
+        except SQLAlchemyError as e:
+            print(f"An error occurred while fetching chat context: {e}")
+            return []
+
+    @staticmethod
+    async def get_between(db: AsyncSession, WA_ID: str, after_id: int, before_id: int, limit: int = 200):
+        """Get context messages with after_id < id < before_id, oldest first"""
+        try:
+            result = await db.execute(
+                select(CHAT_CONTEXT)
+                .where(CHAT_CONTEXT.WA_ID == WA_ID, CHAT_CONTEXT.id > after_id, CHAT_CONTEXT.id < before_id)
+                .order_by(CHAT_CONTEXT.id)
+                .limit(limit)
+            )
+            return [
+                {"id": row.id, "role": row.ROLE, "content": row.CONTENT, "tokens": row.TOKENS}
+                for row in result.scalars()
+            ]
+        except SQLAlchemyError as e:
+            print(f"An error occurred while fetching chat context: {e}")
+            return []
+
+    @staticmethod
+    async def prune(db: AsyncSession, WA_ID: str, keep: int):
+        """Delete all but the newest `keep` context messages of a contact"""
+        try:
+            cutoff = (
+                select(CHAT_CONTEXT.id)
+                .where(CHAT_CONTEXT.WA_ID == WA_ID)
+                .order_by(CHAT_CONTEXT.id.desc())
+                .offset(keep)
+                .limit(1)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                delete(CHAT_CONTEXT).where(CHAT_CONTEXT.WA_ID == WA_ID, CHAT_CONTEXT.id <= cutoff)
+            )
+            await db.commit()
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"An error occurred while pruning chat context: {e}")
+            return 0
+
+
+class ChatSummaryCRUD:
+    @staticmethod
+    async def get_summary(db: AsyncSession, WA_ID: str):
+        """Get the rolling context summary of a contact, or None"""
+        try:
+            result = await db.execute(select(CHAT_SUMMARY).filter_by(WA_ID=WA_ID))
+            return result.scalar_one_or_none()
+        except SQLAlchemyError as e:
+            print(f"An error occurred while fetching chat summary: {e}")
+            return None
+
+    @staticmethod
+    async def save_summary(db: AsyncSession, WA_ID: str, SUMMARY: str, UPTO_ID: int, TOKENS: int):
+        """Insert or replace the rolling context summary of a contact"""
+        values = {"SUMMARY": SUMMARY, "UPTO_ID": UPTO_ID, "TOKENS": TOKENS, "DM": datetime.now()}
+        try:
+            stmt = sqlite_insert(CHAT_SUMMARY).values(WA_ID=WA_ID, **values)
+            await db.execute(stmt.on_conflict_do_update(index_elements=[CHAT_SUMMARY.WA_ID], set_=values))
+            await db.commit()
+            return True
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"An error occurred while saving chat summary: {e}")
+            return False
 
 
+class ProcessedMessageCRUD:
+    @staticmethod
+    async def claim(db: AsyncSession, MESSAGE_ID: str, WA_ID: str):
+        """Record a WhatsApp message id; True if it is new, False if already processed, None on error"""
+        try:
+            stmt = (
+                sqlite_insert(PROCESSED_MESSAGE)
+                .values(MESSAGE_ID=MESSAGE_ID, WA_ID=WA_ID, DC=datetime.now())
+                .on_conflict_do_nothing(index_elements=[PROCESSED_MESSAGE.MESSAGE_ID])
+                .returning(PROCESSED_MESSAGE.MESSAGE_ID)
+            )
+            result = await db.execute(stmt)
+            claimed = result.scalar_one_or_none() is not None
+            await db.commit()
+            return claimed
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"An error occurred while claiming message id: {e}")
+            return None
 
+    @staticmethod
+    async def release(db: AsyncSession, MESSAGE_ID: str):
+        """Forget a message id so a redelivery is processed again"""
+        try:
+            await db.execute(delete(PROCESSED_MESSAGE).filter_by(MESSAGE_ID=MESSAGE_ID))
+            await db.commit()
+            return True
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"An error occurred while releasing message id: {e}")
+            return False
 
+    @staticmethod
+    async def prune(db: AsyncSession, before: datetime):
+        """Delete message ids recorded before `before`"""
+        try:
+            result = await db.execute(delete(PROCESSED_MESSAGE).where(PROCESSED_MESSAGE.DC < before))
+            await db.commit()
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await db.rollback()
+            print(f"An error occurred while pruning processed messages: {e}")
+            return 0
@@ -1,17 +1,61 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from database.sqlite.pros_model import Base, CHAT_HISTO
+from sqlalchemy import inspect, text
+from database.sqlite.settings import (
+    DATABASE_PATH, DB_ECHO, DB_POOL_SIZE, DB_READ_POOL_SIZE, WRITE_PRAGMAS, READ_PRAGMAS,
+    database_url, apply_pragmas,
+)
+from services.metrics import instrument_engine
 import os
 
 
-DATABASE_URL_H = "sqlite+aiosqlite:////app/data/db/sqlite/talktrace.db"
+DATABASE_URL_H = database_url(DATABASE_PATH)
 
 # Create async engine for SQLite
-engine_h = create_async_engine(DATABASE_URL_H, echo=True)
+engine_h = apply_pragmas(
+    create_async_engine(DATABASE_URL_H, echo=DB_ECHO, pool_size=DB_POOL_SIZE),
+    WRITE_PRAGMAS,
+)
+instrument_engine(engine_h, "write")
+
+# Separate read-only pool for dashboard queries, so polling never queues behind writers
+engine_ro = apply_pragmas(
+    create_async_engine(database_url(DATABASE_PATH, read_only=True), echo=DB_ECHO, pool_size=DB_READ_POOL_SIZE),
+    READ_PRAGMAS,
+)
+instrument_engine(engine_ro, "read")
 
 # Create session factory
 AsyncSessionLocal_h = sessionmaker(bind=engine_h, class_=AsyncSession, expire_on_commit=False)
+AsyncSessionLocal_ro = sessionmaker(bind=engine_ro, class_=AsyncSession, expire_on_commit=False)
 
 # Dependency to get DB session
 async def get_db_h():
     async with AsyncSessionLocal_h() as session:
         yield session
+
+# Dependency to get a read-only DB session
+async def get_db_ro():
+    async with AsyncSessionLocal_ro() as session:
+        yield session
+
+
+def migrate_db(conn):
+    """Bring tables created by older versions up to date with the models."""
+    columns = {column["name"] for column in inspect(conn).get_columns("CHAT_HISTO")}
+    if "CONVERSATION" not in columns:
+        conn.execute(text('ALTER TABLE "CHAT_HISTO" ADD COLUMN "CONVERSATION" VARCHAR'))
+        conn.execute(text(
+            'UPDATE "CHAT_HISTO" SET "CONVERSATION" = CASE WHEN "SENDER" < "RECEIVER" '
+            'THEN "SENDER" || \':\' || "RECEIVER" ELSE "RECEIVER" || \':\' || "SENDER" END'
+        ))
+    for index in CHAT_HISTO.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+async def init_db():
+    """Create any missing tables and indexes."""
+    async with engine_h.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(migrate_db)
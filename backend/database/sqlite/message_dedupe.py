@@ -0,0 +1,97 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from database.sqlite.crud import ProcessedMessageCRUD
+
+MESSAGE_DEDUPE_SIZE = int(os.getenv("MESSAGE_DEDUPE_SIZE", "100000"))  # ids remembered in memory
+MESSAGE_DEDUPE_TTL = float(os.getenv("MESSAGE_DEDUPE_TTL", str(7 * 24 * 3600)))  # Meta retries for up to 7 days
+MESSAGE_DEDUPE_PRUNE_EVERY = 1000  # claims between sweeps of expired ids
+
+
+class MessageDeduplicator:
+    """Drops redelivered webhook messages by WhatsApp message id.
+
+    An in-process LRU answers most redeliveries without touching the database;
+    the PROCESSED_MESSAGE table catches the rest (restarts, several processes).
+    """
+
+    def __init__(self, maxsize=MESSAGE_DEDUPE_SIZE, ttl=MESSAGE_DEDUPE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._seen = OrderedDict()  # message id -> expires_at
+
+        # Counters exposed through stats()
+        self.claimed = 0
+        self.released = 0
+        self.memory_hits = 0
+        self.database_hits = 0
+        self.errors = 0
+        self.duplicates_by_type = {}
+
+    def _remember(self, message_id):
+        if self.maxsize <= 0:
+            return
+        self._seen[message_id] = time.monotonic() + self.ttl
+        self._seen.move_to_end(message_id)
+        while len(self._seen) > self.maxsize:
+            self._seen.popitem(last=False)
+
+    def _seen_recently(self, message_id):
+        expires_at = self._seen.get(message_id)
+        if expires_at is None or expires_at < time.monotonic():
+            self._seen.pop(message_id, None)
+            return False
+        return True
+
+    def _duplicate(self, message_type):
+        self.duplicates_by_type[message_type] = self.duplicates_by_type.get(message_type, 0) + 1
+        return False
+
+    async def claim(self, db, message_id, wa_id, message_type):
+        """True if the message should be processed, False if it is a redelivery.
+
+        When the database is unavailable the message is processed (at least once).
+        """
+        if self._seen_recently(message_id):
+            self.memory_hits += 1
+            return self._duplicate(message_type)
+
+        claimed = await ProcessedMessageCRUD.claim(db, message_id, wa_id)
+        if claimed is None:
+            self.errors += 1
+            return True
+        self._remember(message_id)
+        if not claimed:
+            self.database_hits += 1
+            return self._duplicate(message_type)
+
+        self.claimed += 1
+        if self.claimed % MESSAGE_DEDUPE_PRUNE_EVERY == 0:
+            removed = await ProcessedMessageCRUD.prune(db, datetime.now() - timedelta(seconds=self.ttl))
+            logging.info(f"Pruned {removed} expired message ids")
+        return True
+
+    async def release(self, db, message_id):
+        """Undo a claim after processing failed, so Meta's retry is handled."""
+        self._seen.pop(message_id, None)
+        if await ProcessedMessageCRUD.release(db, message_id):
+            self.released += 1
+
+    def stats(self):
+        """Claims and the redeliveries dropped before any write or model call."""
+        return {
+            "remembered": len(self._seen),
+            "claimed": self.claimed,
+            "released": self.released,
+            "duplicates": self.memory_hits + self.database_hits,
+            "memory_hits": self.memory_hits,
+            "database_hits": self.database_hits,
+            "duplicates_by_type": dict(self.duplicates_by_type),
+            "errors": self.errors,
+        }
+
+
+message_dedupe = MessageDeduplicator()
@@ -1,20 +1,29 @@
 from sqlalchemy import Column, String, Float, Text, TIMESTAMP, CheckConstraint, func
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
 from datetime import datetime
 
 Base = declarative_base()
 
 
 
+def conversation_key(SENDER, RECEIVER):
+    """Order-independent key of the conversation between two numbers."""
+    return ":".join(sorted((SENDER, RECEIVER)))
+
+
 class CHAT_HISTO(Base):
     __tablename__ = "CHAT_HISTO"
+    __table_args__ = (
+        Index("ix_chat_histo_conversation_id", "CONVERSATION", "id"),  # a thread is one range scan
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     SENDER = Column(String, index=True)  # e.g., WhatsApp number
     RECEIVER = Column(String)  # "user" or "ai"
     MESSAGE = Column(Text)
     TIMESTAMP = Column(TIMESTAMP, default="CURRENT_TIMESTAMP")
+    CONVERSATION = Column(String)  # conversation_key(SENDER, RECEIVER)
 
 
 class CONTACT(Base):
@@ -26,4 +35,39 @@ class CONTACT(Base):
     STATUS = Column(Integer, default=1)     # 1 = Active, 0 = Inactive
     DC = Column(DateTime, server_default=func.now())  # Date Created
     DM = Column(DateTime, onupdate=func.now(), default=func.now())  # Date Modified
-    DD = Column(DateTime, nullable=True)  # Date Deactivated (optional)    
\ No newline at end of file
+    DD = Column(DateTime, nullable=True)  # Date Deactivated (optional)
+
+
+class CHAT_CONTEXT(Base):
+    __tablename__ = "CHAT_CONTEXT"
+    __table_args__ = (
+        Index("ix_chat_context_wa_id_id", "WA_ID", "id"),  # last-N reads are one range scan
+    )
+
+    id = Column(Integer, primary_key=True)
+    WA_ID = Column(String, nullable=False)  # WhatsApp number of the contact
+    ROLE = Column(String, nullable=False)  # "user", "assistant" or "system"
+    CONTENT = Column(Text, nullable=False)
+    TOKENS = Column(Integer, default=0)  # Estimated prompt tokens of CONTENT
+    TIMESTAMP = Column(DateTime, default=datetime.now)
+
+
+class CHAT_SUMMARY(Base):
+    __tablename__ = "CHAT_SUMMARY"
+
+    WA_ID = Column(String, primary_key=True)  # WhatsApp number of the contact
+    SUMMARY = Column(Text, nullable=False)  # Rolling summary of older context
+    UPTO_ID = Column(Integer, nullable=False)  # Last CHAT_CONTEXT id folded into SUMMARY
+    TOKENS = Column(Integer, default=0)  # Estimated prompt tokens of SUMMARY
+    DM = Column(DateTime, default=datetime.now, onupdate=datetime.now)  # Date Modified
+
+
+class PROCESSED_MESSAGE(Base):
+    __tablename__ = "PROCESSED_MESSAGE"
+    __table_args__ = (
+        Index("ix_processed_message_dc", "DC"),  # expiry sweeps
+    )
+
+    MESSAGE_ID = Column(String, primary_key=True)  # WhatsApp message id (wamid), unique per delivery
+    WA_ID = Column(String, nullable=False)  # Sender of the message
+    DC = Column(DateTime, default=datetime.now)  # Date Created
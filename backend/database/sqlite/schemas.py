@@ -10,6 +10,7 @@ class MessagePayload(BaseModel):
     wa_id: str
 
 class MessageOut(BaseModel):
+    id: int
     SENDER: str
     RECEIVER: str
     MESSAGE: str
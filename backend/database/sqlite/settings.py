@@ -0,0 +1,53 @@
+import os
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+
+DATABASE_PATH = os.getenv("DATABASE_PATH", "/app/data/db/sqlite/talktrace.db")
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"  # logs every statement; debugging only
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "10"))
+
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-16000"))  # negative values are KiB
+
+# Pragmas for the read-write connections
+WRITE_PRAGMAS = {
+    "journal_mode": DB_JOURNAL_MODE,
+    "synchronous": DB_SYNCHRONOUS,
+    "busy_timeout": DB_BUSY_TIMEOUT_MS,
+    "mmap_size": DB_MMAP_SIZE,
+    "cache_size": DB_CACHE_SIZE,
+}
+
+# Pragmas for the dashboard's read-only connections (journal mode is set by the writer)
+READ_PRAGMAS = {
+    "busy_timeout": DB_BUSY_TIMEOUT_MS,
+    "mmap_size": DB_MMAP_SIZE,
+    "cache_size": DB_CACHE_SIZE,
+    "query_only": "ON",
+}
+
+
+def database_url(path=DATABASE_PATH, read_only=False):
+    """SQLAlchemy URL for the SQLite file at `path`, optionally opened read-only."""
+    if read_only:
+        return f"sqlite+aiosqlite:///file:{path}?mode=ro&uri=true"
+    return f"sqlite+aiosqlite:///{path}"
+
+
+def apply_pragmas(engine, pragmas):
+    """Run `pragmas` on every new DBAPI connection of an async engine."""
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import os
+
+from database.sqlite.crud import ChatHistoCRUD
+from database.sqlite.database import AsyncSessionLocal_h
+
+GROUP_COMMIT = os.getenv("GROUP_COMMIT", "0") == "1"
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "5"))
+GROUP_COMMIT_MAX_ROWS = int(os.getenv("GROUP_COMMIT_MAX_ROWS", "500"))
+
+
+class GroupCommitWriter:
+    """Coalesces CHAT_HISTO writes from concurrent requests into one transaction per window."""
+
+    def __init__(self, session_factory=AsyncSessionLocal_h, window_ms=GROUP_COMMIT_WINDOW_MS,
+                 max_rows=GROUP_COMMIT_MAX_ROWS):
+        self.session_factory = session_factory
+        self.window = window_ms / 1000
+        self.max_rows = max_rows
+        self._pending = []  # (rows, future)
+        self._pending_rows = 0
+        self._flush_task = None
+        self._flush_now = False
+        self.commits = 0
+        self.rows_written = 0
+
+    async def write(self, rows):
+        """Queue rows for the next group commit and wait for their ids (None on failure)."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((rows, future))
+        self._pending_rows += len(rows)
+        if self._pending_rows >= self.max_rows and not self._flush_now:
+            # Batch is full: skip the rest of the window
+            if self._flush_task is not None:
+                self._flush_task.cancel()
+            self._flush_now = True
+            self._flush_task = asyncio.create_task(self._flush(0))
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush(self.window))
+        return await future
+
+    async def _flush(self, delay):
+        if delay:
+            await asyncio.sleep(delay)
+        batch, self._pending, self._pending_rows = self._pending, [], 0
+        self._flush_task = None
+        self._flush_now = False
+        if not batch:
+            return
+
+        rows = [row for pending_rows, _ in batch for row in pending_rows]
+        try:
+            async with self.session_factory() as db:
+                ids = await ChatHistoCRUD.add_messages(db, rows)
+        except Exception as e:
+            logging.error(f"Group commit of {len(rows)} messages failed: {e}")
+            ids = None
+
+        if ids is not None:
+            self.commits += 1
+            self.rows_written += len(ids)
+        offset = 0
+        for pending_rows, future in batch:
+            if not future.done():
+                future.set_result(ids[offset:offset + len(pending_rows)] if ids is not None else None)
+            offset += len(pending_rows)
+
+    def stats(self):
+        return {
+            "enabled": GROUP_COMMIT,
+            "commits": self.commits,
+            "rows_written": self.rows_written,
+            "pending_rows": self._pending_rows,
+        }
+
+
+group_writer = GroupCommitWriter()
+
+
+async def save_messages(db, rows):
+    """Persist CHAT_HISTO rows in one transaction, through the group-commit writer when enabled."""
+    if GROUP_COMMIT:
+        return await group_writer.write(rows)
+    return await ChatHistoCRUD.add_messages(db, rows)
@@ -22,10 +22,13 @@ APP_SECRET    = os.getenv("APP_SECRET")
 
 
 
-def validate_signature(payload: str, signature: str) -> bool:
+def validate_signature(payload: bytes, signature: str) -> bool:
+    # Meta signs the raw request bytes, so hash them as received
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
     expected_signature = hmac.new(
         bytes(APP_SECRET, "latin-1"),
-        msg=payload.encode("utf-8"),
+        msg=payload,
         digestmod=hashlib.sha256,
     ).hexdigest()
     return hmac.compare_digest(expected_signature, signature)
@@ -38,6 +41,9 @@ async def verify_signature(request: Request, x_hub_signature_256: str = Header(N
     signature = x_hub_signature_256[7:]
     payload = await request.body()
 
-    if not validate_signature(payload.decode("utf-8"), signature):
+    if not validate_signature(payload, signature):
         logging.info("Signature verification failed!")
         raise HTTPException(status_code=403, detail="Invalid signature")
+
+    # The handler works from these bytes instead of reading and parsing the body again
+    request.state.raw_body = payload
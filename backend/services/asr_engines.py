@@ -0,0 +1,196 @@
+"""Speech recognition engines behind one interface, routed by language.
+
+Every engine takes the raw OGG/Opus voice note (or already decoded PCM) and a
+short language code ("en", "ar", ... or "auto") and returns the transcribed text:
+
+- "google":    Google Web Speech API through SpeechRecognition
+- "dashscope": DashScope streaming recognition, fed PCM while it is decoded
+- "whisper":   local faster-whisper model (int8 on CPU), loaded once per process
+
+ASR_ROUTES maps languages to engines, e.g. "en:google,ar:dashscope,auto:whisper";
+languages without a route use ASR_DEFAULT_ENGINE.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+import speech_recognition as sr
+from dashscope.audio.asr import Recognition, RecognitionCallback, RecognitionResult
+
+from services.audio_pipeline import SAMPLE_RATE, SAMPLE_WIDTH, chunk_bytes, iter_pcm_chunks, transcode_to_pcm
+
+ASR_LANGUAGE = os.getenv("ASR_LANGUAGE", "en")  # language of incoming voice notes, or "auto"
+ASR_ROUTES = os.getenv("ASR_ROUTES", "en:google,ar:dashscope")
+ASR_DEFAULT_ENGINE = os.getenv("ASR_DEFAULT_ENGINE", "google")
+DASHSCOPE_ASR_MODEL = os.getenv("DASHSCOPE_ASR_MODEL", "paraformer-v2-realtime")
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "small")  # model size or path to a converted model
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", "0"))  # 0 lets CTranslate2 decide
+
+# Google expects a locale rather than a bare language code
+GOOGLE_LANGUAGE_CODES = {"en": "en-US", "ar": "ar-SA"}
+
+
+class ASREngine:
+    """Base class: subclasses implement transcribe_pcm(pcm, language) on 16 kHz mono s16le PCM."""
+
+    name = "base"
+
+    def warm_up(self):
+        """Load models or clients ahead of the first voice note."""
+
+    def transcribe(self, audio_data, language):
+        return self.transcribe_pcm(transcode_to_pcm(audio_data), language)
+
+    def transcribe_pcm(self, pcm, language):
+        raise NotImplementedError
+
+
+class GoogleEngine(ASREngine):
+    name = "google"
+
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def transcribe_pcm(self, pcm, language):
+        audio = sr.AudioData(bytes(pcm), SAMPLE_RATE, SAMPLE_WIDTH)
+        if language == "auto":
+            language = "en"
+        try:
+            return self.recognizer.recognize_google(audio, language=GOOGLE_LANGUAGE_CODES.get(language, language))
+        except sr.UnknownValueError:
+            raise ValueError("Speech recognition could not understand the audio.")
+        except sr.RequestError as e:
+            raise ValueError(f"Speech recognition request failed: {e}")
+
+
+class _SentenceCollector(RecognitionCallback):
+    """Collects finished sentences from a streaming DashScope recognition."""
+
+    def __init__(self):
+        self.sentences = []
+        self.error = None
+
+    def on_event(self, result):
+        sentence = result.get_sentence()
+        if isinstance(sentence, dict) and RecognitionResult.is_sentence_end(sentence):
+            self.sentences.append(sentence["text"])
+
+    def on_error(self, result):
+        self.error = result.message
+
+
+class DashScopeEngine(ASREngine):
+    name = "dashscope"
+
+    def transcribe(self, audio_data, language):
+        # Stream while decoding rather than decoding the whole note first
+        return self._stream(iter_pcm_chunks(audio_data), language)
+
+    def transcribe_pcm(self, pcm, language):
+        pcm = memoryview(pcm)
+        step = chunk_bytes()
+        return self._stream((pcm[i:i + step] for i in range(0, len(pcm), step)), language)
+
+    def _stream(self, chunks, language):
+        callback = _SentenceCollector()
+        recognizer = Recognition(
+            callback=callback,
+            format="pcm",  # Raw 16-bit mono PCM from the audio pipeline
+            sample_rate=SAMPLE_RATE,
+            model=DASHSCOPE_ASR_MODEL,
+        )
+        if language == "auto":
+            recognizer.start()
+        else:
+            recognizer.start(language=language)
+        try:
+            for chunk in chunks:
+                recognizer.send_audio_frame(bytes(chunk))
+        finally:
+            recognizer.stop()
+
+        if callback.error:
+            raise ValueError(f"Error in transcription: {callback.error}")
+        return " ".join(callback.sentences)
+
+
+class WhisperEngine(ASREngine):
+    """Local faster-whisper model; no network round trip and no rate limit."""
+
+    name = "whisper"
+
+    def __init__(self):
+        self.model = None
+        self._load_lock = threading.Lock()
+
+    def warm_up(self):
+        with self._load_lock:
+            if self.model is None:
+                from faster_whisper import WhisperModel
+
+                self.model = WhisperModel(WHISPER_MODEL, device="cpu", compute_type=WHISPER_COMPUTE_TYPE,
+                                          cpu_threads=WHISPER_THREADS)
+                logging.info(f"Loaded whisper model {WHISPER_MODEL} ({WHISPER_COMPUTE_TYPE})")
+
+    def transcribe_pcm(self, pcm, language):
+        if self.model is None:
+            self.warm_up()
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        segments, info = self.model.transcribe(
+            samples,
+            language=None if language == "auto" else language,
+            beam_size=1,
+            vad_filter=True,
+        )
+        return " ".join(segment.text.strip() for segment in segments)
+
+
+ENGINES = {
+    "google": GoogleEngine,
+    "dashscope": DashScopeEngine,
+    "whisper": WhisperEngine,
+}
+
+
+def parse_routes(routes=ASR_ROUTES):
+    """Turn "en:google,ar:dashscope" into {"en": "google", "ar": "dashscope"}."""
+    parsed = {}
+    for route in routes.split(","):
+        if ":" in route:
+            language, engine = route.split(":", 1)
+            parsed[language.strip()] = engine.strip()
+    return parsed
+
+
+_routes = parse_routes()
+_engines = {}  # one instance per engine and process, so local models stay loaded
+
+
+def get_engine(name):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown ASR engine: {name}")
+    if name not in _engines:
+        _engines[name] = ENGINES[name]()
+    return _engines[name]
+
+
+def engine_for(language):
+    return get_engine(_routes.get(language, ASR_DEFAULT_ENGINE))
+
+
+def warm_up():
+    """Instantiate every routed engine and load local models."""
+    for name in set(_routes.values()) | {ASR_DEFAULT_ENGINE}:
+        get_engine(name).warm_up()
+
+
+def transcribe(audio_data, language=ASR_LANGUAGE):
+    """Transcribe an OGG/Opus voice note with the engine routed for `language`."""
+    return engine_for(language).transcribe(audio_data, language)
+
+
+def transcribe_pcm(pcm, language=ASR_LANGUAGE):
+    """Transcribe 16 kHz mono s16le PCM with the engine routed for `language`."""
+    return engine_for(language).transcribe_pcm(pcm, language)
@@ -0,0 +1,211 @@
+"""In-memory transcoding of WhatsApp voice notes (OGG/Opus) to 16 kHz mono PCM.
+
+Backends, selected with AUDIO_BACKEND:
+
+- "pyav":  decode and resample in-process with PyAV's bundled FFmpeg libraries
+- "opus":  demux the Ogg container here and let libopus decode straight to 16 kHz
+- "pydub": the previous path, which runs an ffmpeg subprocess per note
+
+All backends yield PCM as signed 16-bit little-endian samples in fixed-size chunks.
+"""
+import ctypes
+import ctypes.util
+import os
+import struct
+from io import BytesIO
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # bytes, s16le
+AUDIO_BACKEND = os.getenv("AUDIO_BACKEND", "pyav")
+AUDIO_CHUNK_MS = int(os.getenv("AUDIO_CHUNK_MS", "100"))
+OPUS_LIBRARY = os.getenv("OPUS_LIBRARY") or ctypes.util.find_library("opus")
+
+OPUS_MAX_FRAME = SAMPLE_RATE * 120 // 1000  # samples in the longest (120 ms) Opus frame
+
+
+def chunk_bytes(chunk_ms=AUDIO_CHUNK_MS):
+    return SAMPLE_RATE * SAMPLE_WIDTH * chunk_ms // 1000
+
+
+class ChunkBuffer:
+    """Re-slices PCM pieces of any size into fixed-size chunks using one reusable buffer.
+
+    Chunks are yielded as memoryviews of the shared buffer, valid until the next chunk.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.filled = 0
+
+    def feed(self, pcm):
+        pcm = memoryview(pcm).cast("B")
+        offset = 0
+        while offset < len(pcm):
+            take = min(self.size - self.filled, len(pcm) - offset)
+            self.view[self.filled:self.filled + take] = pcm[offset:offset + take]
+            self.filled += take
+            offset += take
+            if self.filled == self.size:
+                self.filled = 0
+                yield self.view
+
+    def flush(self):
+        if self.filled:
+            filled, self.filled = self.filled, 0
+            yield self.view[:filled]
+
+
+# --- Ogg demuxing -----------------------------------------------------------------
+
+def iter_ogg_packets(data):
+    """Yield the packets of the first logical stream in an Ogg file.
+
+    Packets contained in one page are zero-copy memoryviews of `data`; only
+    packets spanning pages are joined into new bytes.
+    """
+    view = memoryview(data)
+    offset = 0
+    serial = None
+    partial = []
+    while offset + 27 <= len(view):
+        if view[offset:offset + 4] != b"OggS":
+            raise ValueError("Invalid Ogg page")
+        page_serial, = struct.unpack_from("<I", view, offset + 14)
+        segments = view[offset + 26]
+        lacing = view[offset + 27:offset + 27 + segments]
+        body = offset + 27 + segments
+        page_end = body + sum(lacing)
+        if page_end > len(view):
+            raise ValueError("Truncated Ogg page")
+
+        if serial is None:
+            serial = page_serial
+        if page_serial == serial:
+            start = body
+            length = 0
+            for lace in lacing:
+                length += lace
+                if lace < 255:
+                    packet = view[start:start + length]
+                    if partial:
+                        partial.append(packet)
+                        packet = b"".join(partial)
+                        partial = []
+                    yield packet
+                    start += length
+                    length = 0
+            if length:
+                partial.append(view[start:start + length])
+        offset = page_end
+
+
+# --- Backends ---------------------------------------------------------------------
+
+def _load_libopus():
+    if not OPUS_LIBRARY:
+        raise ValueError("libopus not found; install libopus0 or set OPUS_LIBRARY")
+    lib = ctypes.CDLL(OPUS_LIBRARY)
+    lib.opus_decoder_create.restype = ctypes.c_void_p
+    lib.opus_decoder_create.argtypes = [ctypes.c_int32, ctypes.c_int, ctypes.POINTER(ctypes.c_int)]
+    lib.opus_decode.restype = ctypes.c_int
+    lib.opus_decode.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int32,
+                                ctypes.POINTER(ctypes.c_int16), ctypes.c_int, ctypes.c_int]
+    lib.opus_decoder_destroy.restype = None
+    lib.opus_decoder_destroy.argtypes = [ctypes.c_void_p]
+    return lib
+
+
+_libopus = None
+
+
+def _opus_pieces(data):
+    """Decode OGG/Opus with libopus at 16 kHz mono, so no separate resampling pass is needed."""
+    global _libopus
+    if _libopus is None:
+        _libopus = _load_libopus()
+
+    packets = iter_ogg_packets(data)
+    head = bytes(next(packets, b""))
+    if not head.startswith(b"OpusHead"):
+        raise ValueError("Not an Ogg/Opus stream")
+    # Pre-skip and granule positions are counted in 48 kHz samples
+    pre_skip = struct.unpack_from("<H", head, 10)[0]
+    last_page = data.rfind(b"OggS")
+    granule, = struct.unpack_from("<q", data, last_page + 6)
+    remaining = max(granule - pre_skip, 0) * SAMPLE_RATE // 48000
+    pre_skip = pre_skip * SAMPLE_RATE // 48000
+    next(packets, None)  # OpusTags
+
+    error = ctypes.c_int()
+    decoder = _libopus.opus_decoder_create(SAMPLE_RATE, 1, ctypes.byref(error))
+    if error.value != 0 or not decoder:
+        raise ValueError(f"opus_decoder_create failed ({error.value})")
+    pcm = (ctypes.c_int16 * OPUS_MAX_FRAME)()
+    pcm_bytes = memoryview(pcm).cast("B")
+    try:
+        for packet in packets:
+            packet = bytes(packet)  # ctypes needs bytes; Opus packets are a few hundred bytes at most
+            samples = _libopus.opus_decode(decoder, packet, len(packet), pcm, OPUS_MAX_FRAME, 0)
+            if samples < 0:
+                raise ValueError(f"opus_decode failed ({samples})")
+            skip = min(pre_skip, samples)
+            pre_skip -= skip
+            keep = min(samples - skip, remaining)
+            remaining -= keep
+            if keep:
+                yield pcm_bytes[skip * SAMPLE_WIDTH:(skip + keep) * SAMPLE_WIDTH]
+    finally:
+        _libopus.opus_decoder_destroy(decoder)
+
+
+def _pyav_pieces(data):
+    """Decode and resample in-process with PyAV."""
+    import av
+
+    with av.open(BytesIO(data), format="ogg") as container:
+        resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+        for frame in container.decode(audio=0):
+            for out in resampler.resample(frame):
+                yield memoryview(out.planes[0])[:out.samples * SAMPLE_WIDTH]
+        for out in resampler.resample(None):
+            yield memoryview(out.planes[0])[:out.samples * SAMPLE_WIDTH]
+
+
+def _pydub_pieces(data):
+    """Previous path: ffmpeg subprocess through pydub."""
+    from pydub import AudioSegment
+
+    segment = AudioSegment.from_file(BytesIO(data), format="ogg")
+    yield segment.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(SAMPLE_WIDTH).raw_data
+
+
+BACKENDS = {
+    "pyav": _pyav_pieces,
+    "opus": _opus_pieces,
+    "pydub": _pydub_pieces,
+}
+
+
+def iter_pcm_chunks(data, backend=AUDIO_BACKEND, chunk_ms=AUDIO_CHUNK_MS):
+    """Stream 16 kHz mono s16le PCM from OGG/Opus bytes in chunks of `chunk_ms`.
+
+    Each chunk is a memoryview of a reused buffer and is only valid until the next one.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown audio backend: {backend}")
+    chunks = ChunkBuffer(chunk_bytes(chunk_ms))
+    for piece in BACKENDS[backend](data):
+        yield from chunks.feed(piece)
+    yield from chunks.flush()
+
+
+def transcode_to_pcm(data, backend=AUDIO_BACKEND):
+    """Decode OGG/Opus bytes to a single 16 kHz mono s16le PCM buffer."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown audio backend: {backend}")
+    pcm = bytearray()
+    for piece in BACKENDS[backend](data):
+        pcm += piece
+    return bytes(pcm)
@@ -0,0 +1,104 @@
+"""Split decoded voice notes into segments that can be transcribed independently.
+
+Long notes are cut in the longest pause found in the second half of each
+SEGMENT_MAX_SECONDS window. Where the speaker never pauses, the window is cut
+hard and the next segment starts SEGMENT_OVERLAP_MS earlier, so no word is
+lost; stitch() removes the words repeated across such an overlap.
+"""
+import os
+
+import numpy as np
+
+from services.audio_pipeline import SAMPLE_RATE, SAMPLE_WIDTH, transcode_to_pcm
+
+SEGMENT_MAX_SECONDS = float(os.getenv("SEGMENT_MAX_SECONDS", "20"))
+SEGMENT_OVERLAP_MS = int(os.getenv("SEGMENT_OVERLAP_MS", "500"))
+SEGMENT_SILENCE_DBFS = float(os.getenv("SEGMENT_SILENCE_DBFS", "-40"))
+SEGMENT_MIN_SILENCE_MS = int(os.getenv("SEGMENT_MIN_SILENCE_MS", "300"))
+
+FRAME_MS = 20
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+STITCH_MAX_WORDS = 8  # longest repeated phrase looked for across an overlap
+
+
+def frame_levels(samples):
+    """Loudness of each 20 ms frame in dBFS."""
+    frames = len(samples) // FRAME_SAMPLES
+    framed = samples[:frames * FRAME_SAMPLES].astype(np.float32).reshape(frames, FRAME_SAMPLES)
+    rms = np.sqrt(np.mean(framed * framed, axis=1)) / 32768.0
+    return 20 * np.log10(np.maximum(rms, 1e-9))
+
+
+def _longest_pause(silent, start, end, min_frames):
+    """Middle frame of the longest run of silent frames in [start, end), or None."""
+    best_length, best_middle = 0, None
+    run_start = None
+    for frame in range(start, end + 1):
+        if frame < end and silent[frame]:
+            if run_start is None:
+                run_start = frame
+        elif run_start is not None:
+            length = frame - run_start
+            if length >= min_frames and length > best_length:
+                best_length, best_middle = length, run_start + length // 2
+            run_start = None
+    return best_middle
+
+
+def split_pcm(pcm, max_seconds=SEGMENT_MAX_SECONDS, overlap_ms=SEGMENT_OVERLAP_MS,
+              silence_dbfs=SEGMENT_SILENCE_DBFS, min_silence_ms=SEGMENT_MIN_SILENCE_MS):
+    """Return (start, end) byte offsets of the segments of 16 kHz mono s16le PCM.
+
+    Segments overlap only where the audio had to be cut without a pause.
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    max_frames = max(int(max_seconds * 1000 // FRAME_MS), 1)
+    if len(samples) <= max_frames * FRAME_SAMPLES:
+        return [(0, len(pcm))]
+
+    silent = frame_levels(samples) < silence_dbfs
+    total = len(silent)
+    min_frames = max(min_silence_ms // FRAME_MS, 1)
+    overlap_frames = min(overlap_ms // FRAME_MS, max_frames // 2)
+    frame_bytes = FRAME_SAMPLES * SAMPLE_WIDTH
+
+    bounds = []
+    start = 0
+    while total - start > max_frames:
+        end = start + max_frames
+        pause = _longest_pause(silent, start + max_frames // 2, end, min_frames)
+        if pause is not None:
+            cut, next_start = pause, pause
+        else:
+            cut, next_start = end, end - overlap_frames
+        bounds.append((start * frame_bytes, cut * frame_bytes))
+        start = next_start
+    bounds.append((start * frame_bytes, len(pcm)))
+    return bounds
+
+
+def decode_and_split(audio_data):
+    """Decode an OGG/Opus note and segment it; runs in the audio worker pool."""
+    pcm = transcode_to_pcm(audio_data)
+    return pcm, split_pcm(pcm)
+
+
+def stitch(texts, bounds):
+    """Join segment transcripts in order, dropping words repeated across overlapping cuts."""
+    words = []
+    previous_end = None
+    for text, (start, end) in zip(texts, bounds):
+        segment_words = (text or "").split()
+        if previous_end is not None and start < previous_end and words:
+            lowered = [w.lower() for w in segment_words]
+            for k in range(min(STITCH_MAX_WORDS, len(words), len(segment_words)), 0, -1):
+                if [w.lower() for w in words[-k:]] == lowered[:k]:
+                    segment_words = segment_words[k:]
+                    break
+        words.extend(segment_words)
+        previous_end = end
+    return " ".join(words)
+
+
+def segment_seconds(start, end):
+    return (end - start) / (SAMPLE_RATE * SAMPLE_WIDTH)
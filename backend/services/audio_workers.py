@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+AUDIO_POOL = os.getenv("AUDIO_POOL", "process")  # "process" or "thread"
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", str(min(4, os.cpu_count() or 1))))
+AUDIO_MAX_PENDING = int(os.getenv("AUDIO_MAX_PENDING", "32"))  # queued + running jobs
+AUDIO_JOB_TIMEOUT = float(os.getenv("AUDIO_JOB_TIMEOUT", "60"))
+
+
+class PoolBusyError(Exception):
+    """Raised when the pool already holds `max_pending` jobs."""
+
+
+def _warm_up():
+    # Import the decoders and load local ASR models once per worker instead of on the first job.
+    # Never raise here: a failing process pool initializer breaks the whole pool.
+    try:
+        import services.speech_recognition  # noqa: F401
+        from services import asr_engines
+
+        asr_engines.warm_up()
+    except Exception as e:
+        logging.error(f"Audio worker warm-up failed: {e}")
+
+
+def _timed_call(fn, args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+class AudioWorkerPool:
+    """Bounded executor for CPU-bound decode and transcription jobs, awaited from the event loop."""
+
+    def __init__(self, workers=AUDIO_WORKERS, max_pending=AUDIO_MAX_PENDING, timeout=AUDIO_JOB_TIMEOUT,
+                 mode=AUDIO_POOL, name="audio"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.mode = mode
+        self.name = name
+        self._executor = None
+
+        # Counters exposed through stats()
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            if self.mode == "process":
+                # spawn: forking a process that runs an event loop and threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_up,
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            logging.info(f"Started {self.workers} {self.name} {self.mode} workers (max pending {self.max_pending})")
+        return self._executor
+
+    def warm_up(self):
+        """Start the workers and load ASR models in the background, ahead of the first voice note."""
+        self.executor.submit(_warm_up)
+
+    async def run(self, fn, *args, timeout=None):
+        """Run `fn(*args)` in the pool; raises PoolBusyError, asyncio.TimeoutError or the job's error.
+
+        Cancelling the caller (or hitting the timeout) drops the job if it has not started yet;
+        a job already running in a worker is left to finish and its result discarded.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolBusyError(f"{self.name} pool is full ({self.pending} jobs pending)")
+
+        self.pending += 1
+        self.submitted += 1
+        submitted = time.perf_counter()
+        future = self.executor.submit(_timed_call, fn, args)
+        try:
+            result, run_seconds = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            self.timed_out += 1
+            logging.warning(f"{self.name}: {getattr(fn, '__name__', fn)} timed out after {timeout or self.timeout}s")
+            raise
+        except asyncio.CancelledError:
+            future.cancel()
+            self.cancelled += 1
+            raise
+        except BrokenExecutor:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next job
+            self.failed += 1
+            logging.error(f"{self.name}: worker pool broken, restarting it")
+            self.shutdown()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+
+        self.completed += 1
+        self.total_run += run_seconds
+        self.total_wait += max(time.perf_counter() - submitted - run_seconds, 0.0)
+        return result
+
+    def shutdown(self):
+        """Stop the workers, dropping jobs that have not started."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        """Pool occupancy and job timing counters."""
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "avg_wait_seconds": round(self.total_wait / self.completed, 4) if self.completed else 0.0,
+            "avg_run_seconds": round(self.total_run / self.completed, 4) if self.completed else 0.0,
+        }
+
+
+audio_pool = AudioWorkerPool()
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+COALESCE_WINDOW_MS = int(os.getenv("COALESCE_WINDOW_MS", "0"))  # quiet period; 0 disables coalescing
+COALESCE_MAX_WAIT_MS = int(os.getenv("COALESCE_MAX_WAIT_MS", "5000"))  # longest a first message waits
+COALESCE_MAX_MESSAGES = int(os.getenv("COALESCE_MAX_MESSAGES", "10"))
+
+
+class _Batch:
+    def __init__(self, future):
+        self.future = future
+        self.items = []
+        self.started = time.monotonic()
+        self.timer = None
+
+
+class MessageCoalescer:
+    """Collects one contact's items until it goes quiet, then hands them to `handler` as one batch.
+
+    Every submitter awaits the batch's result. Batches of the same contact never
+    run concurrently, so turns are generated and sent in arrival order.
+    """
+
+    def __init__(self, handler, window_ms=COALESCE_WINDOW_MS, max_wait_ms=COALESCE_MAX_WAIT_MS,
+                 max_items=COALESCE_MAX_MESSAGES, name="coalesce"):
+        self.handler = handler
+        self.window = window_ms / 1000
+        self.max_wait = max_wait_ms / 1000
+        self.max_items = max_items
+        self.name = name
+        self._pending = {}  # key -> _Batch still collecting
+        self._locks = {}  # key -> [asyncio.Lock, users]
+        self._running = set()
+
+        # Counters exposed through stats()
+        self.submitted = 0
+        self.batches = 0
+        self.coalesced = 0  # items answered as part of an earlier item's turn
+        self.largest_batch = 0
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    @asynccontextmanager
+    async def _lock(self, key):
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def submit(self, key, item):
+        """Add `item` to the contact's open batch and wait for that batch's result."""
+        loop = asyncio.get_running_loop()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch(loop.create_future())
+        batch.items.append(item)
+        self.submitted += 1
+
+        # Each new item restarts the quiet period, up to max_wait after the first one
+        if batch.timer is not None:
+            batch.timer.cancel()
+        remaining = self.max_wait - (time.monotonic() - batch.started)
+        delay = 0 if len(batch.items) >= self.max_items else max(min(self.window, remaining), 0)
+        batch.timer = loop.call_later(delay, self._flush, key)
+
+        # Shielded: a caller going away must not cancel the turn for the others
+        return await asyncio.shield(batch.future)
+
+    def _flush(self, key):
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        task = asyncio.ensure_future(self._run(key, batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, key, batch):
+        async with self._lock(key):
+            self.batches += 1
+            self.coalesced += len(batch.items) - 1
+            self.largest_batch = max(self.largest_batch, len(batch.items))
+            if len(batch.items) > 1:
+                logging.info(f"{self.name}: handling {len(batch.items)} messages from {key} as one turn")
+            try:
+                batch.future.set_result(await self.handler(key, batch.items))
+            except Exception as e:
+                batch.future.set_exception(e)
+
+    async def drain(self):
+        """Run every open batch now and wait for all batches to finish (used at shutdown)."""
+        for key, batch in list(self._pending.items()):
+            batch.timer.cancel()
+            self._flush(key)
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def stats(self):
+        """Messages submitted and the batches they were merged into."""
+        return {
+            "enabled": self.enabled,
+            "open_batches": len(self._pending),
+            "submitted": self.submitted,
+            "batches": self.batches,
+            "coalesced": self.coalesced,
+            "largest_batch": self.largest_batch,
+        }
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+from database.sqlite.crud import ChatContextCRUD, ChatSummaryCRUD
+from database.sqlite.database import AsyncSessionLocal_h
+from services.context_store import estimate_tokens, trim_window
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))  # prompt tokens per request
+CONTEXT_SUMMARY = os.getenv("CONTEXT_SUMMARY", "1") == "1"
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "200"))
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "1024"))
+
+
+class ContextBuilder:
+    """Fits conversation history into a token budget.
+
+    Recent turns are kept verbatim. Turns that fall out of the budget are folded
+    into a rolling per-contact summary, which is updated in the background with
+    only the newly dropped turns.
+    """
+
+    def __init__(self, summarize, session_factory=AsyncSessionLocal_h, budget=CONTEXT_TOKEN_BUDGET,
+                 summary_enabled=CONTEXT_SUMMARY, summary_max_tokens=SUMMARY_MAX_TOKENS,
+                 cache_size=SUMMARY_CACHE_SIZE):
+        self.summarize = summarize  # async (previous_summary, messages) -> new summary
+        self.session_factory = session_factory
+        self.budget = budget
+        self.summary_enabled = summary_enabled
+        self.summary_max_tokens = summary_max_tokens
+        self.cache_size = cache_size
+        self._summaries = OrderedDict()  # wa_id -> {"text", "upto_id", "tokens"}
+        self._refreshing = {}  # wa_id -> task
+
+        self.requests = 0
+        self.history_tokens = 0
+        self.prompt_tokens = 0
+        self.tokens_saved = 0
+        self.summaries_refreshed = 0
+
+    async def _get_summary(self, wa_id):
+        summary = self._summaries.get(wa_id)
+        if summary is None:
+            async with self.session_factory() as db:
+                row = await ChatSummaryCRUD.get_summary(db, wa_id)
+            summary = {"text": row.SUMMARY, "upto_id": row.UPTO_ID, "tokens": row.TOKENS} if row else \
+                {"text": "", "upto_id": 0, "tokens": 0}
+            self._remember(wa_id, summary)
+        else:
+            self._summaries.move_to_end(wa_id)
+        return summary
+
+    def _remember(self, wa_id, summary):
+        self._summaries[wa_id] = summary
+        self._summaries.move_to_end(wa_id)
+        while len(self._summaries) > self.cache_size:
+            self._summaries.popitem(last=False)
+
+    async def build(self, wa_id, history, user_message):
+        """Return the chat messages to send for `user_message` given the contact's `history`.
+
+        `history` is the oldest-first list returned by ContextStore.get().
+        """
+        user_tokens = estimate_tokens(user_message["content"])
+        summary = await self._get_summary(wa_id) if self.summary_enabled else None
+
+        reserved = user_tokens + (self.summary_max_tokens if summary is not None else 0)
+        recent = trim_window(history, None, max(self.budget - reserved, 0))
+
+        messages = []
+        if summary is not None:
+            if summary["text"]:
+                messages.append({
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation: {summary['text']}",
+                })
+            first_recent_id = recent[0]["id"] if recent else (history[-1]["id"] + 1 if history else None)
+            if first_recent_id is not None and first_recent_id - 1 > summary["upto_id"]:
+                self._schedule_refresh(wa_id, summary, first_recent_id)
+        messages.extend({"role": m["role"], "content": m["content"]} for m in recent)
+        messages.append(user_message)
+
+        history_tokens = sum(m["tokens"] for m in history) + user_tokens
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        self.requests += 1
+        self.history_tokens += history_tokens
+        self.prompt_tokens += prompt_tokens
+        self.tokens_saved += max(history_tokens - prompt_tokens, 0)
+        logging.info(
+            f"Context for {wa_id}: {prompt_tokens} prompt tokens "
+            f"({len(recent)}/{len(history)} turns verbatim, {max(history_tokens - prompt_tokens, 0)} saved)"
+        )
+        return messages
+
+    def _schedule_refresh(self, wa_id, summary, before_id):
+        if wa_id in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(wa_id, summary, before_id))
+        self._refreshing[wa_id] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(wa_id, None))
+
+    async def _refresh(self, wa_id, summary, before_id):
+        """Fold the turns between the summary and the verbatim window into the summary."""
+        try:
+            async with self.session_factory() as db:
+                dropped = await ChatContextCRUD.get_between(db, wa_id, summary["upto_id"], before_id)
+                if not dropped:
+                    return
+                text = await self.summarize(summary["text"], dropped)
+                refreshed = {"text": text, "upto_id": dropped[-1]["id"], "tokens": estimate_tokens(text)}
+                await ChatSummaryCRUD.save_summary(
+                    db, wa_id, refreshed["text"], refreshed["upto_id"], refreshed["tokens"]
+                )
+            self._remember(wa_id, refreshed)
+            self.summaries_refreshed += 1
+        except Exception as e:
+            logging.warning(f"Failed to refresh context summary for {wa_id}: {e}")
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "history_tokens": self.history_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "tokens_saved": self.tokens_saved,
+            "summaries_refreshed": self.summaries_refreshed,
+            "summaries_refreshing": len(self._refreshing),
+        }
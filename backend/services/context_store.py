@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from database.sqlite.crud import ChatContextCRUD
+from database.sqlite.database import AsyncSessionLocal_h
+
+CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", "40"))  # messages read per turn
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "4000"))  # tokens read per turn
+CONTEXT_RETAIN_TURNS = int(os.getenv("CONTEXT_RETAIN_TURNS", "500"))  # messages kept on disk per contact
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "1024"))  # hot contacts kept in memory
+CONTEXT_PRUNE_EVERY = 50  # appends between prune passes for a contact
+
+
+def estimate_tokens(text):
+    """Cheap prompt-token estimate (about 4 UTF-8 bytes per token)."""
+    return max(1, len(text.encode("utf-8")) // 4)
+
+
+def trim_window(messages, max_turns, max_tokens):
+    """Keep the newest messages that fit in `max_turns` messages and `max_tokens` tokens."""
+    window = []
+    tokens = 0
+    for message in reversed(messages[-max_turns:] if max_turns else messages):
+        tokens += message["tokens"]
+        if max_tokens is not None and tokens > max_tokens:
+            break
+        window.append(message)
+    window.reverse()
+    return window
+
+
+class ContextStore:
+    """Conversation context per wa_id, stored append-only in SQLite with an LRU of hot contacts."""
+
+    def __init__(self, session_factory=AsyncSessionLocal_h, max_turns=CONTEXT_MAX_TURNS,
+                 max_tokens=CONTEXT_MAX_TOKENS, retain_turns=CONTEXT_RETAIN_TURNS,
+                 cache_size=CONTEXT_CACHE_SIZE):
+        self.session_factory = session_factory
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.retain_turns = retain_turns
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # wa_id -> messages in the default window
+        self._locks = {}  # wa_id -> [lock, users]
+        self._appends = {}  # wa_id -> appends since the last prune
+        self.hits = 0
+        self.misses = 0
+
+    @asynccontextmanager
+    async def lock(self, wa_id):
+        """Serialize read-modify-append turns for one contact."""
+        entry = self._locks.setdefault(wa_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[wa_id]
+
+    def _remember(self, wa_id, messages):
+        if self.cache_size <= 0:
+            return
+        self._cache[wa_id] = messages
+        self._cache.move_to_end(wa_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def get(self, wa_id, max_turns=None, max_tokens=None):
+        """Return the newest context messages for a contact, oldest first.
+
+        Each message is a dict with "id", "role", "content" and "tokens".
+        """
+        max_turns = max_turns or self.max_turns
+        max_tokens = max_tokens or self.max_tokens
+        within_default = max_turns <= self.max_turns and max_tokens <= self.max_tokens
+
+        cached = self._cache.get(wa_id)
+        if cached is not None and within_default:
+            self.hits += 1
+            self._cache.move_to_end(wa_id)
+            return trim_window(cached, max_turns, max_tokens)
+
+        self.misses += 1
+        async with self.session_factory() as db:
+            messages = await ChatContextCRUD.get_recent(db, wa_id, max_turns, max_tokens)
+        if max_turns == self.max_turns and max_tokens == self.max_tokens:
+            self._remember(wa_id, messages)
+        return messages
+
+    async def append(self, wa_id, messages):
+        """Append {"role", "content"} messages for a contact."""
+        rows = [
+            {"role": m["role"], "content": m["content"], "tokens": estimate_tokens(m["content"])}
+            for m in messages
+        ]
+        async with self.session_factory() as db:
+            ids = await ChatContextCRUD.append_messages(db, wa_id, rows)
+            if ids is None:
+                # Drop the cached window rather than let it diverge from the table
+                self._cache.pop(wa_id, None)
+                return False
+
+            self._appends[wa_id] = self._appends.get(wa_id, 0) + len(rows)
+            if self._appends[wa_id] >= CONTEXT_PRUNE_EVERY:
+                self._appends[wa_id] = 0
+                pruned = await ChatContextCRUD.prune(db, wa_id, self.retain_turns)
+                if pruned:
+                    logging.info(f"Pruned {pruned} old context messages for {wa_id}")
+
+        for row, row_id in zip(rows, ids):
+            row["id"] = row_id
+
+        cached = self._cache.get(wa_id)
+        if cached is not None:
+            cached = cached + rows
+            self._remember(wa_id, trim_window(cached, self.max_turns, self.max_tokens))
+        return True
+
+    def stats(self):
+        return {
+            "cached_contacts": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+context_store = ContextStore()
@@ -1,53 +1,179 @@
-import shelve
+import asyncio
 import time
 import logging
 import os
-from openai import OpenAI
+from contextlib import asynccontextmanager, contextmanager
+from openai import APIStatusError, AsyncOpenAI
 from dotenv import load_dotenv
+from services.context_store import context_store
+from services.context_builder import ContextBuilder, SUMMARY_MAX_TOKENS
+from services.response_cache import response_cache
+from services.metrics import observe_http, record_token_usage
 
 # Load environment variables from .env file
 load_dotenv()
 dashscope_api_key= os.getenv("DASHSCOPE_API_KEY")
 
-client = OpenAI(api_key=dashscope_api_key, base_url="https://dashscope-intl.aliyuncs.com/compatible-mode/v1")
-
-
-
-
-
-def check_if_chat_exists(wa_id,name):
-    logging.info(f"Creating new thread for {name} with wa_id {wa_id}")
-    with shelve.open("chat_history_db") as chat_shelf:
-        return chat_shelf.get(wa_id, [])
-
-def store_chat_history(wa_id, chat_history):
-    with shelve.open("chat_history_db", writeback=True) as chat_shelf:
-        chat_shelf[wa_id] = chat_history
-
-def generate_response(message_body, wa_id, name):
-    # Retrieve existing chat history
-    chat_history = check_if_chat_exists(wa_id,name)
-    
-    # Append the new user message
-    chat_history.append({"role": "user", "content": message_body})
-    
-    response = client.chat.completions.create(
-                model="qwen-plus",
-                messages=chat_history,
-                max_tokens=100  # Adjust as needed
-            )
-    
-    # Extract and log the response
-    new_message = response.choices[0].message.content
-    logging.info(f"Generated message: {new_message}")
-    
-    # Append assistant response to history
-    chat_history.append({"role": "assistant", "content": new_message})
-    
-    # Store updated chat history
-    store_chat_history(wa_id, chat_history)
-    
-    return new_message
+# Point DASHSCOPE_BASE_URL at a local OpenAI-compatible mock to benchmark without DashScope
+DASHSCOPE_BASE_URL = os.getenv("DASHSCOPE_BASE_URL", "https://dashscope-intl.aliyuncs.com/compatible-mode/v1")
+LLM_MODEL = os.getenv("LLM_MODEL", "qwen-plus")
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "100"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_STREAM = os.getenv("LLM_STREAM", "0") == "1"
+
+client = AsyncOpenAI(api_key=dashscope_api_key, base_url=DASHSCOPE_BASE_URL, timeout=LLM_TIMEOUT)
+
+# Bounds the number of completions in flight. Turns of one contact are already
+# serialized by context_store.lock, so there is no per-contact limit.
+# Created lazily so it binds to the server's event loop, not the import-time one.
+_completion_slots = None
+
+
+@asynccontextmanager
+async def completion_slot():
+    """Acquire one of the LLM_MAX_CONCURRENCY completion slots."""
+    global _completion_slots
+    if _completion_slots is None:
+        _completion_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    async with _completion_slots:
+        yield
+
+
+async def check_if_chat_exists(wa_id,name):
+    """Return the recent conversation context for a contact."""
+    history = await context_store.get(wa_id)
+    if not history:
+        logging.info(f"Creating new thread for {name} with wa_id {wa_id}")
+    return history
+
+async def prefetch_context(wa_id):
+    """Warm the context cache for a contact ahead of generate_response."""
+    try:
+        await context_store.get(wa_id)
+    except Exception as e:
+        logging.warning(f"Context prefetch failed for {wa_id}: {e}")
+
+async def store_chat_history(wa_id, new_messages):
+    """Append the messages of the latest turn to the contact's context."""
+    await context_store.append(wa_id, new_messages)
+
+
+@contextmanager
+def llm_request():
+    """Record the latency and status of a model request as an outbound HTTP call."""
+    started = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = 200
+    except APIStatusError as e:
+        status = e.status_code
+        raise
+    finally:
+        observe_http("llm", "POST", status, time.perf_counter() - started)
+
 
+async def create_completion(messages):
+    """Request a completion and return its text."""
+    with llm_request():
+        response = await client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=messages,
+                    max_tokens=LLM_MAX_TOKENS  # Adjust as needed
+                )
+    record_token_usage("reply", response.usage)
+    return response.choices[0].message.content
 
 
+async def stream_completion(messages):
+    """Request a streamed completion and assemble its text, logging time-to-first-token."""
+    started = time.monotonic()
+    first_token = None
+    parts = []
+    with llm_request():
+        stream = await client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=messages,
+                    max_tokens=LLM_MAX_TOKENS,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+        async for chunk in stream:
+            # The last chunk carries the token usage and no choices
+            if chunk.usage is not None:
+                record_token_usage("reply", chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                parts.append(delta)
+    total = time.monotonic() - started
+    if first_token is not None:
+        logging.info(f"Streamed completion: first token after {first_token:.3f}s, done after {total:.3f}s")
+    return "".join(parts)
+
+
+async def summarize_messages(previous_summary, messages):
+    """Fold `messages` into `previous_summary` with a short completion."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = [
+        {
+            "role": "system",
+            "content": "You maintain a running summary of a WhatsApp customer conversation. "
+                       "Update the summary with the new messages. Keep names, requests, facts and "
+                       "open questions; drop small talk. Reply with the summary only.",
+        },
+        {
+            "role": "user",
+            "content": f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}",
+        },
+    ]
+    # Counts against the global limit only: background summaries must not hold up the contact's reply
+    async with completion_slot():
+        with llm_request():
+            response = await client.chat.completions.create(
+                        model=LLM_MODEL,
+                        messages=prompt,
+                        max_tokens=SUMMARY_MAX_TOKENS
+                    )
+    record_token_usage("summary", response.usage)
+    return response.choices[0].message.content.strip()
+
+
+context_builder = ContextBuilder(summarize_messages)
+
+
+async def generate_response(message_body, wa_id, name):
+    # One turn at a time per contact so concurrent messages never race on history
+    async with context_store.lock(wa_id):
+        # Retrieve existing chat history
+        chat_history = await check_if_chat_exists(wa_id,name)
+
+        # Fit the history and the new user message into the token budget
+        user_message = {"role": "user", "content": message_body}
+        prompt = await context_builder.build(wa_id, chat_history, user_message)
+
+        # Repeated questions with the same prompt context are answered from the cache
+        cache_key = response_cache.key(LLM_MODEL, prompt)
+        new_message = response_cache.get(cache_key)
+        if new_message is not None:
+            logging.info(f"Answered {wa_id} from the response cache")
+        else:
+            started = time.perf_counter()
+            async with completion_slot():
+                if LLM_STREAM:
+                    new_message = await stream_completion(prompt)
+                else:
+                    new_message = await create_completion(prompt)
+            response_cache.put(cache_key, new_message, time.perf_counter() - started)
+
+            # Extract and log the response
+            logging.info(f"Generated message: {new_message}")
+
+        # Store the user message and assistant response
+        await store_chat_history(wa_id, [user_message, {"role": "assistant", "content": new_message}])
+
+    return new_message
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+
+
+class JobQueue:
+    """Bounded in-process job queue drained by a fixed pool of asyncio workers."""
+
+    def __init__(self, handler, workers=4, maxsize=1000, max_retries=3, retry_delay=1.0, name="jobs"):
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.name = name
+
+        self._queue = None
+        self._tasks = []
+        self._pending_retries = set()
+
+        # Counters exposed through stats()
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+    async def start(self):
+        """Create the queue and spawn the workers (must run inside the event loop)."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"{self.name}-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logging.info(f"Started {self.workers} {self.name} workers (queue size {self.maxsize})")
+
+    async def stop(self, timeout=10.0):
+        """Let queued jobs drain for up to `timeout` seconds, then cancel the workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"{self.name}: {self._queue.qsize()} jobs left in queue at shutdown")
+        for retry in list(self._pending_retries):
+            retry.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, job):
+        """Queue a job without blocking. Returns False when the queue is full or not started."""
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait((job, 0, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    async def _retry_later(self, job, attempt, delay):
+        await asyncio.sleep(delay)
+        try:
+            self._queue.put_nowait((job, attempt, time.monotonic()))
+        except asyncio.QueueFull:
+            self.failed += 1
+            logging.error(f"{self.name}: queue full, dropping job after {attempt} attempts")
+
+    async def _worker(self, worker_id):
+        while True:
+            job, attempt, queued_at = await self._queue.get()
+            started = time.monotonic()
+            self.total_wait += started - queued_at
+            self.in_flight += 1
+            try:
+                await self.handler(job)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt < self.max_retries:
+                    # Back off exponentially without holding the worker
+                    delay = self.retry_delay * (2 ** attempt)
+                    logging.warning(f"{self.name}: job failed ({e}), retrying in {delay:.1f}s")
+                    self.retried += 1
+                    retry = asyncio.create_task(self._retry_later(job, attempt + 1, delay))
+                    self._pending_retries.add(retry)
+                    retry.add_done_callback(self._pending_retries.discard)
+                else:
+                    logging.error(f"{self.name}: job failed after {attempt + 1} attempts: {e}")
+                    self.failed += 1
+            finally:
+                self.in_flight -= 1
+                self.total_run += time.monotonic() - started
+                self._queue.task_done()
+
+    def stats(self):
+        """Queue depth and throughput counters."""
+        finished = self.processed + self.failed + self.retried
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "workers": len(self._tasks),
+            "in_flight": self.in_flight,
+            "pending_retries": len(self._pending_retries),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rejected": self.rejected,
+            "avg_wait_seconds": round(self.total_wait / finished, 4) if finished else 0.0,
+            "avg_run_seconds": round(self.total_run / finished, 4) if finished else 0.0,
+        }
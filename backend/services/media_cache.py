@@ -0,0 +1,225 @@
+"""Disk cache of downloaded WhatsApp media and their transcripts.
+
+Audio is stored once per content hash under blobs/, with transcripts next to
+it; ids/ maps WhatsApp media ids (hashed, as they come from the webhook) to
+content hashes, and each blob's <hash>.ids lists the mappings pointing at it.
+A redelivered webhook hits by media id and skips the Graph API, while forwarded
+audio (new media id, same bytes) still skips recognition. Blobs are evicted
+least recently used, together with their transcripts and id mappings, once the
+cache grows past MEDIA_CACHE_MAX_MB.
+
+The methods do blocking file I/O; call them through asyncio.to_thread.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "/app/data/media")
+MEDIA_CACHE_MAX_MB = int(os.getenv("MEDIA_CACHE_MAX_MB", "512"))
+
+
+def _write_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class MediaCache:
+    """Content-addressed media store with size-based LRU eviction."""
+
+    def __init__(self, directory=MEDIA_CACHE_DIR, max_bytes=MEDIA_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._blobs = None  # sha256 -> bytes on disk, least recently used first
+        self._size = 0
+
+        # Counters exposed through stats()
+        self.media_hits = 0
+        self.content_hits = 0
+        self.misses = 0
+        self.transcript_hits = 0
+        self.evictions = 0
+
+    def _blob_dir(self, digest):
+        return os.path.join(self.directory, "blobs", digest[:2])
+
+    def path(self, digest):
+        """Location of the audio stored under `digest`."""
+        return os.path.join(self._blob_dir(digest), f"{digest}.ogg")
+
+    def _transcript_path(self, digest, language):
+        return os.path.join(self._blob_dir(digest), f"{digest}.{language}.txt")
+
+    def _id_name(self, media_id):
+        # Never use the webhook-supplied id itself as a file name
+        return hashlib.sha256(media_id.encode("utf-8")).hexdigest()
+
+    def _id_path(self, id_name):
+        return os.path.join(self.directory, "ids", id_name)
+
+    def _ids_path(self, digest):
+        return os.path.join(self._blob_dir(digest), f"{digest}.ids")
+
+    def _read_ids(self, digest):
+        try:
+            with open(self._ids_path(digest)) as f:
+                return f.read().split()
+        except FileNotFoundError:
+            return []
+
+    def _read_mapping(self, id_name):
+        try:
+            with open(self._id_path(id_name)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _load_index(self):
+        # Rebuild the LRU order from modification times, which every hit refreshes
+        if self._blobs is not None:
+            return
+        entries = []
+        for root, _, files in os.walk(os.path.join(self.directory, "blobs")):
+            for name in files:
+                if name.endswith(".ogg"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, name[:-4], self._entry_size(name[:-4], stat.st_size)))
+        entries.sort()
+        self._blobs = OrderedDict((digest, size) for _, digest, size in entries)
+        self._size = sum(self._blobs.values())
+
+    def _entry_size(self, digest, audio_size):
+        # Audio, transcripts, the .ids list and the ids/ mapping files it names
+        directory = self._blob_dir(digest)
+        size = audio_size
+        for name in os.listdir(directory):
+            if name.startswith(digest) and name.endswith((".txt", ".ids")):
+                size += os.path.getsize(os.path.join(directory, name))
+        return size + len(digest) * len(self._read_ids(digest))
+
+    def _touch(self, digest):
+        self._blobs.move_to_end(digest)
+        try:
+            os.utime(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def lookup(self, media_id):
+        """Hash of the audio already downloaded for `media_id`, or None."""
+        id_name = self._id_name(media_id)
+        with self._lock:
+            self._load_index()
+            digest = self._read_mapping(id_name)
+            if digest is None:
+                self.misses += 1
+                return None
+            if digest not in self._blobs:
+                # The audio is gone; forget the stale id mapping
+                os.unlink(self._id_path(id_name))
+                self.misses += 1
+                return None
+            self.media_hits += 1
+            self._touch(digest)
+            return digest
+
+    def get_audio(self, digest):
+        try:
+            with open(self.path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put_audio(self, media_id, content):
+        """Store downloaded audio under its sha256 and map `media_id` to it; returns the hash."""
+        digest = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            self._load_index()
+            if digest in self._blobs:
+                self.content_hits += 1
+                self._touch(digest)
+            else:
+                _write_atomic(self.path(digest), content)
+                self._blobs[digest] = len(content)
+                self._size += len(content)
+            self._map_id(self._id_name(media_id), digest)
+            self._evict(keep=digest)
+        return digest
+
+    def _map_id(self, id_name, digest):
+        if self._read_mapping(id_name) == digest:
+            return
+        _write_atomic(self._id_path(id_name), digest.encode())
+        with open(self._ids_path(digest), "a") as f:
+            f.write(id_name + "\n")
+        added = len(id_name) + 1 + len(digest)
+        self._blobs[digest] += added
+        self._size += added
+
+    def get_transcript(self, digest, language):
+        try:
+            with open(self._transcript_path(digest, language), encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        self.transcript_hits += 1
+        return text
+
+    def put_transcript(self, digest, language, text):
+        content = text.encode("utf-8")
+        with self._lock:
+            self._load_index()
+            if digest not in self._blobs:
+                return
+            path = self._transcript_path(digest, language)
+            try:
+                previous = os.path.getsize(path)
+            except FileNotFoundError:
+                previous = 0
+            _write_atomic(path, content)
+            self._blobs[digest] += len(content) - previous
+            self._size += len(content) - previous
+
+    def _evict(self, keep):
+        while self._size > self.max_bytes and len(self._blobs) > 1:
+            digest, size = next(iter(self._blobs.items()))
+            if digest == keep:
+                break
+            del self._blobs[digest]
+            self._size -= size
+            self.evictions += 1
+            for id_name in self._read_ids(digest):
+                # Unless the media id was remapped to other audio since
+                if self._read_mapping(id_name) == digest:
+                    os.unlink(self._id_path(id_name))
+            directory = self._blob_dir(digest)
+            for name in os.listdir(directory):
+                if name.startswith(digest):
+                    os.unlink(os.path.join(directory, name))
+            logging.info(f"Evicted cached media {digest}")
+
+    def stats(self):
+        """Cache size and hit counters."""
+        return {
+            "entries": len(self._blobs) if self._blobs is not None else 0,
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "media_hits": self.media_hits,
+            "content_hits": self.content_hits,
+            "misses": self.misses,
+            "transcript_hits": self.transcript_hits,
+            "evictions": self.evictions,
+        }
+
+
+media_cache = MediaCache()
@@ -0,0 +1,130 @@
+"""Prometheus metrics for the webhook pipeline, served at /metrics.
+
+Metrics live in the process that records them: with several uvicorn workers
+every worker reports its own values, and audio pool processes report none
+(their work is timed by the caller under the "transcribe" stage).
+"""
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+
+# Seconds; spans cached SQLite reads up to slow voice note transcriptions
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_SECONDS = Histogram(
+    "talktrace_request_seconds", "HTTP requests served, by route and status", ["route", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge("talktrace_requests_in_flight", "HTTP requests being served")
+
+WEBHOOK_DELIVERIES = Counter(
+    "talktrace_webhook_deliveries_total", "Webhook deliveries by kind (message, status, unknown, invalid)", ["kind"]
+)
+WEBHOOK_MESSAGES = Counter("talktrace_webhook_messages_total", "Messages received through the webhook", ["type"])
+
+STAGE_SECONDS = Histogram(
+    "talktrace_stage_seconds", "Time spent in each stage of handling a message", ["stage"], buckets=LATENCY_BUCKETS
+)
+STAGE_IN_FLIGHT = Gauge("talktrace_stage_in_flight", "Messages currently in each stage", ["stage"])
+
+DB_QUERY_SECONDS = Histogram(
+    "talktrace_db_query_seconds", "SQL statements executed, by engine and statement type", ["engine", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter("talktrace_db_query_errors_total", "SQL statements that failed", ["engine", "operation"])
+
+HTTP_CLIENT_SECONDS = Histogram(
+    "talktrace_http_client_seconds", "Outbound HTTP requests, by service and status", ["service", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+LLM_TOKENS = Counter("talktrace_llm_tokens_total", "Tokens reported by the model", ["purpose", "kind"])
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as pipeline stage `name` and count it as in flight meanwhile."""
+    in_flight = STAGE_IN_FLIGHT.labels(name)
+    in_flight.inc()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+        in_flight.dec()
+
+
+def observe_http(service, method, status, seconds):
+    """Record one outbound HTTP call; `status` is the response code or "error"."""
+    HTTP_CLIENT_SECONDS.labels(service, method, str(status)).observe(seconds)
+
+
+def record_token_usage(purpose, usage):
+    """Count the prompt and completion tokens of a completion's `usage`, when the model reports it."""
+    if usage is None:
+        return
+    LLM_TOKENS.labels(purpose, "prompt").inc(usage.prompt_tokens or 0)
+    LLM_TOKENS.labels(purpose, "completion").inc(usage.completion_tokens or 0)
+
+
+def _operation(statement):
+    words = statement.split(None, 1)
+    return words[0].upper() if words else "UNKNOWN"
+
+
+def instrument_engine(engine, name):
+    """Time every statement run on an async engine through SQLAlchemy cursor events."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        DB_QUERY_SECONDS.labels(name, _operation(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def count_query_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        DB_QUERY_ERRORS.labels(name, _operation(context.statement or "")).inc()
+
+    return engine
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # Labelled by route template (known once routing ran) to keep ids out of the label values
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(route, scope["method"], str(status)).observe(time.perf_counter() - started)
+
+
+def render():
+    """Body and content type of the /metrics response."""
+    return generate_latest(), CONTENT_TYPE_LATEST
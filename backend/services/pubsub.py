@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import os
+
+PUBSUB_QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE_SIZE", "256"))  # buffered events per subscriber
+
+
+class Broker:
+    """In-process pub/sub: fans events out to every subscriber of a topic."""
+
+    def __init__(self, queue_size=PUBSUB_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._topics = {}  # topic -> set of queues
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, *topics):
+        """Register a queue receiving (topic, event) for each of `topics`."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        for topic in topics:
+            self._topics.setdefault(topic, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, queue, *topics):
+        for topic in topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._topics[topic]
+
+    def publish(self, topic, event):
+        """Deliver an event without blocking; slow subscribers lose their oldest events."""
+        self.published += 1
+        for queue in self._topics.get(topic, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+                logging.warning(f"Subscriber to {topic} is lagging, dropped an event")
+            queue.put_nowait((topic, event))
+
+    def stats(self):
+        return {
+            "topics": len(self._topics),
+            "subscribers": sum(len(queues) for queues in self._topics.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+def conversation_topic(wa_id):
+    return f"conversation:{wa_id}"
+
+
+CONTACTS_TOPIC = "contacts"
+
+broker = Broker()
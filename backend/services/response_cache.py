@@ -0,0 +1,182 @@
+"""Answer cache in front of the model for repeated (FAQ-style) questions.
+
+Entries are keyed on the normalized question plus a hash of everything else in
+the prompt sent to the model (rolling summary and earlier turns). An answer is
+therefore only reused when the model would have seen the same context, e.g.
+first questions of new contacts, and never carries one contact's history over
+to another. With RESPONSE_CACHE_SIMILARITY set, questions phrased slightly
+differently can also hit: each question is mapped to a hashed
+bag-of-words/character-trigram vector and compared by cosine similarity
+against the cached questions sharing its context hash.
+"""
+import hashlib
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "0") == "1"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))  # e.g. 0.9; 0 = exact only
+
+VECTOR_DIMENSIONS = 1024
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text):
+    """Case-, width- and punctuation-insensitive form of a question."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", text)).strip()
+
+
+def context_hash(messages):
+    """Hash of the roles and contents of `messages`."""
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(message["role"].encode())
+        digest.update(b"\0")
+        digest.update(normalize(message["content"]).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def embed(normalized):
+    """Unit-length hashed vector of the words and character trigrams of a normalized question."""
+    vector = np.zeros(VECTOR_DIMENSIONS, dtype=np.float32)
+    padded = f" {normalized} "
+    features = normalized.split() + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    for feature in features:
+        index = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=4).digest(), "little")
+        vector[index % VECTOR_DIMENSIONS] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _Entry:
+    __slots__ = ("answer", "expires_at", "seconds")
+
+    def __init__(self, answer, expires_at, seconds):
+        self.answer = answer
+        self.expires_at = expires_at
+        self.seconds = seconds  # model time a hit saves
+
+
+class ResponseCache:
+    """LRU + TTL cache of model answers with an optional similarity tier."""
+
+    def __init__(self, enabled=RESPONSE_CACHE, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL,
+                 similarity=RESPONSE_CACHE_SIMILARITY):
+        self.enabled = enabled and maxsize > 0
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()  # (model, context hash, normalized question) -> _Entry
+        self._by_context = {}  # (model, context hash) -> {key: vector}, for the similarity tier
+        self._matrices = {}  # (model, context hash) -> (keys, stacked vectors), rebuilt on change
+
+        # Counters exposed through stats()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.seconds_saved = 0.0
+
+    def key(self, model, prompt):
+        """Cache key for the prompt built by ContextBuilder (question last), or None when caching is off."""
+        if not self.enabled:
+            return None
+        return model, context_hash(prompt[:-1]), normalize(prompt[-1]["content"])
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        group = key[:2]
+        vectors = self._by_context.get(group)
+        if vectors is not None:
+            vectors.pop(key, None)
+            self._matrices.pop(group, None)
+            if not vectors:
+                del self._by_context[group]
+        return entry
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at < time.monotonic():
+            self._drop(key)
+            return None
+        return entry
+
+    def _nearest(self, key):
+        group = key[:2]
+        vectors = self._by_context.get(group)
+        if not vectors:
+            return None
+        if group not in self._matrices:
+            keys = list(vectors)
+            self._matrices[group] = (keys, np.stack([vectors[k] for k in keys]))
+        keys, matrix = self._matrices[group]
+        scores = matrix @ embed(key[2])
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        return keys[best]
+
+    def get(self, key):
+        """Cached answer for `key`, or None."""
+        if key is None:
+            return None
+        entry = self._live(key)
+        if entry is not None:
+            self.exact_hits += 1
+        elif self.similarity > 0:
+            similar = self._nearest(key)
+            entry = self._live(similar) if similar is not None else None
+            if entry is not None:
+                self.similar_hits += 1
+                key = similar
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.seconds_saved += entry.seconds
+        return entry.answer
+
+    def put(self, key, answer, seconds):
+        """Remember `answer`, which took `seconds` to generate."""
+        if key is None or not answer:
+            return
+        if key in self._entries:
+            self._drop(key)
+        vector = embed(key[2]) if self.similarity > 0 else None
+        self._entries[key] = _Entry(answer, time.monotonic() + self.ttl, seconds)
+        if vector is not None:
+            self._by_context.setdefault(key[:2], {})[key] = vector
+            self._matrices.pop(key[:2], None)
+        self.stores += 1
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self):
+        """Hit rate and model time saved."""
+        lookups = self.exact_hits + self.similar_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.similar_hits) / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "seconds_saved": round(self.seconds_saved, 3),
+        }
+
+
+response_cache = ResponseCache()
@@ -1,8 +1,7 @@
 import speech_recognition as sr
-from io import BytesIO
-import os,sys
 from pydub import AudioSegment
-from dashscope.audio.asr import Recognition
+from services import asr_engines
+from services.asr_engines import ASR_LANGUAGE
 
 def convert_ogg_to_wav(orig_song):
     # Replace the .ogg extension with .wav for the destination file
@@ -18,81 +17,26 @@ def convert_ogg_to_wav(orig_song):
 
 def transcribe_audio_ar(audio_data):
     """
-    Transcribe audio from raw bytes using DashScope's Speech Recognition API.
-    
+    Transcribe Arabic audio from raw bytes with the engine routed for "ar".
+
     Args:
         audio_data (bytes): Raw audio data in OGG format.
-    
+
     Returns:
         str: Transcribed text in Arabic.
     """
-    try:
-        # Debugging: Check the type of audio_data
-        print(f"Type of audio_data: {type(audio_data)}")
+    return transcribe_audio(audio_data, language="ar")
 
+def transcribe_audio(audio_data, language=ASR_LANGUAGE):
+    """Transcribe audio from raw bytes with the engine routed for `language` (see ASR_ROUTES)."""
+    try:
         # Ensure audio_data is bytes
         if isinstance(audio_data, str):
             raise ValueError("Input must be raw bytes, not a string.")
+        return asr_engines.transcribe(audio_data, language)
 
-        # Convert OGG to WAV using pydub
-        ogg_audio = AudioSegment.from_file(BytesIO(audio_data), format="ogg")
-        wav_audio = BytesIO()
-        ogg_audio.export(wav_audio, format="wav")
-        wav_audio.seek(0)  # Rewind the buffer to the beginning
-
-        # Debugging: Check the type of wav_audio.getvalue()
-        print(f"Type of wav_audio.getvalue(): {type(wav_audio.getvalue())}")
-
-        # Initialize the DashScope Recognition API
-        recognizer = Recognition(
-            callback=None,          # No callback function for now
-            format="wav",           # Audio format (WAV)
-            sample_rate=16000,      # Sample rate of the audio
-            model="paraformer-v2-realtime"
-        )
-        file = '/app/'
-        # Perform speech-to-text transcription with DashScope
-        response = recognizer.call(
-            file=wav_audio.getvalue(),  # Pass the raw bytes of the WAV file
-            language="ar"              # Specify Arabic language
-        )
-
-        # Debugging: Check the response
-        print(f"Response status code: {response.status_code}")
-        print(f"Response message: {response.message}")
-
-        # Check if the request was successful
-        if response.status_code == 200:
-            transcription = response.output["text"]
-            return transcription
-        else:
-            raise ValueError(f"Error in transcription: {response.message}")
-
-    except Exception as e:
-        raise ValueError(f"Error processing audio: {e}")
-
-def transcribe_audio(audio_data):
-    """Transcribe audio from raw bytes using Google Speech Recognition."""
-    recognizer = sr.Recognizer()
-
-    try:
-        # Convert OGG to WAV using pydub
-        ogg_audio = AudioSegment.from_file(BytesIO(audio_data), format="ogg")
-        wav_audio = BytesIO()
-        ogg_audio.export(wav_audio, format="wav")
-        wav_audio.seek(0)  # Rewind the buffer to the beginning
-
-        # Transcribe the WAV audio
-        with sr.AudioFile(wav_audio) as source:
-            audio = recognizer.record(source)
-        
-        text = recognizer.recognize_google(audio)
-        return text
-
-    except sr.UnknownValueError:
-        raise ValueError("Speech recognition could not understand the audio.")
-    except sr.RequestError as e:
-        raise ValueError(f"Speech recognition request failed: {e}")
+    except ValueError:
+        raise
     except Exception as e:
         raise ValueError(f"Error processing audio: {e}")
 
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+import time
+
+from services.asr_engines import ASR_LANGUAGE, transcribe_pcm
+from services.audio_segmenter import decode_and_split, segment_seconds, stitch
+from services.audio_workers import audio_pool
+
+SEGMENT_CONCURRENCY = int(os.getenv("SEGMENT_CONCURRENCY", "4"))  # segments of one note in flight
+
+
+class SegmentedTranscriber:
+    """Transcribes voice notes segment by segment, concurrently, in the audio worker pool."""
+
+    def __init__(self, pool, concurrency=SEGMENT_CONCURRENCY):
+        self.pool = pool
+        self.concurrency = concurrency
+
+        # Counters exposed through stats()
+        self.notes = 0
+        self.segments = 0
+        self.segments_failed = 0
+        self.audio_seconds = 0.0
+        self.decode_seconds = 0.0
+        self.segment_seconds = 0.0
+        self.note_seconds = 0.0
+
+    async def transcribe(self, audio_data, language=ASR_LANGUAGE, on_segment=None):
+        """Return the transcript of an OGG/Opus note.
+
+        `on_segment(index, total, text, seconds)` is called as each segment finishes,
+        which is not necessarily in order.
+        """
+        started = time.perf_counter()
+        pcm, bounds = await self.pool.run(decode_and_split, audio_data)
+        self.decode_seconds += time.perf_counter() - started
+        self.notes += 1
+        self.segments += len(bounds)
+        self.audio_seconds += segment_seconds(0, len(pcm))
+
+        slots = asyncio.Semaphore(self.concurrency)
+        texts = [None] * len(bounds)
+
+        async def run_segment(index, start, end):
+            async with slots:
+                segment_started = time.perf_counter()
+                try:
+                    texts[index] = await self.pool.run(transcribe_pcm, pcm[start:end], language)
+                except ValueError as e:
+                    # Silence or noise in one segment should not lose the rest of the note
+                    self.segments_failed += 1
+                    logging.warning(f"Segment {index + 1}/{len(bounds)} not transcribed: {e}")
+                    texts[index] = ""
+            elapsed = time.perf_counter() - segment_started
+            self.segment_seconds += elapsed
+            logging.info(
+                f"Segment {index + 1}/{len(bounds)} ({segment_seconds(start, end):.1f}s of audio) "
+                f"transcribed in {elapsed:.2f}s"
+            )
+            if on_segment is not None:
+                on_segment(index, len(bounds), texts[index], elapsed)
+
+        tasks = [asyncio.ensure_future(run_segment(i, start, end)) for i, (start, end) in enumerate(bounds)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        text = stitch(texts, bounds)
+        self.note_seconds += time.perf_counter() - started
+        if not text:
+            raise ValueError("Speech recognition could not understand the audio.")
+        return text
+
+    def stats(self):
+        """Segment counts and average timings."""
+        return {
+            "notes": self.notes,
+            "segments": self.segments,
+            "segments_failed": self.segments_failed,
+            "audio_seconds": round(self.audio_seconds, 1),
+            "avg_decode_seconds": round(self.decode_seconds / self.notes, 4) if self.notes else 0.0,
+            "avg_segment_seconds": round(self.segment_seconds / self.segments, 4) if self.segments else 0.0,
+            "avg_note_seconds": round(self.note_seconds / self.notes, 4) if self.notes else 0.0,
+        }
+
+
+transcriber = SegmentedTranscriber(audio_pool)
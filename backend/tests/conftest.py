@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# Settings are read at import time, so they are set before any backend module is imported
+DATA_DIR = tempfile.mkdtemp(prefix="talktrace-test-")
+os.environ.update(
+    APP_SECRET="test-secret",
+    DASHSCOPE_API_KEY="test",
+    PHONE_NUMBER_ID="100000000000001",
+    DATABASE_PATH=os.path.join(DATA_DIR, "talktrace.db"),
+    MEDIA_CACHE_DIR=os.path.join(DATA_DIR, "media"),
+    AUDIO_POOL="thread",
+)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,41 @@
+import asyncio
+
+from database.sqlite.database import init_db
+from services import dashscope_service
+from services.response_cache import ResponseCache
+
+
+def test_contacts_with_different_history_do_not_share_answers(monkeypatch):
+    monkeypatch.setattr(dashscope_service, "response_cache", ResponseCache(enabled=True))
+    prompts = []
+
+    async def create_completion(prompt):
+        prompts.append(prompt)
+        return f"answer {len(prompts)}"
+
+    monkeypatch.setattr(dashscope_service, "create_completion", create_completion)
+
+    async def scenario():
+        await init_db()
+        # Different earlier turns, identical last two turns and question
+        for wa_id, order in (("212600000101", "A-1001"), ("212600000102", "B-2002")):
+            await dashscope_service.store_chat_history(wa_id, [
+                {"role": "user", "content": f"I placed order {order}"},
+                {"role": "assistant", "content": "Noted."},
+                {"role": "user", "content": "Thanks"},
+                {"role": "assistant", "content": "You're welcome!"},
+            ])
+        first = await dashscope_service.generate_response("What is my order number?", "212600000101", "A")
+        second = await dashscope_service.generate_response("What is my order number?", "212600000102", "B")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert (first, second) == ("answer 1", "answer 2")
+    assert dashscope_service.response_cache.stats()["exact_hits"] == 0
+
+
+def test_same_prompt_context_hits():
+    cache = ResponseCache(enabled=True)
+    prompt = [{"role": "user", "content": "What are your opening hours?"}]
+    cache.put(cache.key("qwen-plus", prompt), "9 to 5", 1.0)
+    assert cache.get(cache.key("qwen-plus", [{"role": "user", "content": "what are your opening hours"}])) == "9 to 5"
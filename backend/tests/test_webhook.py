@@ -0,0 +1,101 @@
+import hashlib
+import hmac
+import json
+
+from fastapi.testclient import TestClient
+
+import app as backend
+
+
+def post_webhook(client, payload):
+    raw = json.dumps(payload).encode()
+    signature = "sha256=" + hmac.new(b"test-secret", raw, hashlib.sha256).hexdigest()
+    return client.post(
+        "/webhook", content=raw, headers={"Content-Type": "application/json", "X-Hub-Signature-256": signature}
+    )
+
+
+def delivery(message):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"field": "messages", "value": {
+            "contacts": [{"profile": {"name": "Test"}, "wa_id": message["from"]}],
+            "messages": [message],
+        }}]}],
+    }
+
+
+def test_unsupported_message_type_is_acknowledged():
+    message = {
+        "from": "212600000001", "id": "wamid.image1", "type": "image",
+        "image": {"id": "media1", "mime_type": "image/jpeg"},
+    }
+    with TestClient(backend.app) as client:
+        response = post_webhook(client, delivery(message))
+        assert response.status_code == 200
+
+        # Stored as a placeholder and not handled again on redelivery
+        assert post_webhook(client, delivery(message)).status_code == 200
+        history = client.post("/history", params={"user_id": "212600000001"})
+        assert [row["MESSAGE"] for row in history.json()] == ["[image]"]
+
+
+def test_failed_reply_then_redelivery_stores_the_message_once(monkeypatch):
+    import utils.whatsapp_utils as whatsapp_utils
+
+    failures = [RuntimeError("model unavailable")] * 2
+
+    async def generate_response(message_body, wa_id, name):
+        if failures:
+            raise failures.pop()
+        return "answer"
+
+    async def send_message(data):
+        return None
+
+    monkeypatch.setattr(whatsapp_utils, "generate_response", generate_response)
+    monkeypatch.setattr(whatsapp_utils, "send_message", send_message)
+    message = {"from": "212600000002", "id": "wamid.retry1", "type": "text", "text": {"body": "hello"}}
+
+    with TestClient(backend.app, raise_server_exceptions=False) as client:
+        # Meta redelivers the same message until it gets a 200
+        assert post_webhook(client, delivery(message)).status_code == 500
+        assert post_webhook(client, delivery(message)).status_code == 500
+        assert post_webhook(client, delivery(message)).status_code == 200
+        assert post_webhook(client, delivery(message)).status_code == 200  # duplicate, skipped
+
+        history = client.post("/history", params={"user_id": "212600000002"})
+        assert [row["MESSAGE"] for row in history.json()] == ["hello", "answer"]
+
+
+def test_busy_audio_pool_is_retried_and_unintelligible_audio_is_not(monkeypatch):
+    import utils.whatsapp_utils as whatsapp_utils
+    from services.audio_workers import PoolBusyError
+
+    outcomes = [ValueError("no speech recognized"), PoolBusyError("audio pool is full")]
+    sent = []
+
+    async def fetch_and_transcribe(media_id, on_segment=None):
+        raise outcomes.pop()
+
+    async def send_message(data):
+        sent.append(json.loads(data)["text"]["body"])
+
+    monkeypatch.setattr(whatsapp_utils, "fetch_and_transcribe", fetch_and_transcribe)
+    monkeypatch.setattr(whatsapp_utils, "send_message", send_message)
+    message = {
+        "from": "212600000003", "id": "wamid.audio1", "type": "audio",
+        "audio": {"id": "media3", "mime_type": "audio/ogg; codecs=opus"},
+    }
+
+    with TestClient(backend.app, raise_server_exceptions=False) as client:
+        # A full pool isn't the sender's fault: no reply, and the redelivery is handled
+        assert post_webhook(client, delivery(message)).status_code == 500
+        assert sent == []
+        assert post_webhook(client, delivery(message)).status_code == 200
+        assert sent == ["I couldn't understand your audio. Please record it again."]
+
+        history = client.post("/history", params={"user_id": "212600000003"})
+        assert [row["MESSAGE"] for row in history.json()] == [
+            "[audio: not transcribed]", "I couldn't understand your audio. Please record it again.",
+        ]
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+from services.metrics import observe_http
+
+load_dotenv()
+
+ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
+
+# Point GRAPH_API_URL at a local stub server to test or benchmark without Meta
+GRAPH_API_URL = os.getenv("GRAPH_API_URL", "https://graph.facebook.com")
+GRAPH_HTTP2 = os.getenv("GRAPH_HTTP2", "1") == "1"
+GRAPH_MAX_CONNECTIONS = int(os.getenv("GRAPH_MAX_CONNECTIONS", "50"))
+GRAPH_MAX_KEEPALIVE = int(os.getenv("GRAPH_MAX_KEEPALIVE", "20"))
+GRAPH_MAX_PER_HOST = int(os.getenv("GRAPH_MAX_PER_HOST", "20"))
+GRAPH_TIMEOUT = float(os.getenv("GRAPH_TIMEOUT", "10"))
+GRAPH_MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", "3"))
+GRAPH_BACKOFF = float(os.getenv("GRAPH_BACKOFF", "0.5"))
+# Longest wait before a retry; a longer Retry-After gives up and returns the response
+GRAPH_MAX_BACKOFF = float(os.getenv("GRAPH_MAX_BACKOFF", str(GRAPH_TIMEOUT)))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# A 5xx after a POST may come after Graph accepted it (e.g. a sent message); only a 429 is safe to retry
+POST_RETRY_STATUSES = {429}
+
+# Errors raised before the request reached the server, so retrying can't duplicate a send
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class GraphClient:
+    """Shared async client for the Graph API with keep-alive pooling and retries."""
+
+    def __init__(self, base_url=GRAPH_API_URL, access_token=ACCESS_TOKEN, http2=GRAPH_HTTP2,
+                 max_connections=GRAPH_MAX_CONNECTIONS, max_keepalive=GRAPH_MAX_KEEPALIVE,
+                 max_per_host=GRAPH_MAX_PER_HOST, timeout=GRAPH_TIMEOUT,
+                 max_retries=GRAPH_MAX_RETRIES, backoff=GRAPH_BACKOFF, max_backoff=GRAPH_MAX_BACKOFF):
+        self.base_url = base_url
+        self.access_token = access_token
+        self.http2 = http2
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.max_per_host = max_per_host
+        self.timeout = httpx.Timeout(timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._client = None
+        self._host_slots = {}
+
+    @property
+    def client(self):
+        """Create the underlying httpx client lazily, inside the running event loop."""
+        if self._client is None or self._client.is_closed:
+            http2 = self.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logging.warning("h2 is not installed, falling back to HTTP/1.1 for the Graph API")
+                    http2 = False
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=http2,
+                limits=self.limits,
+                timeout=self.timeout,
+                headers={"Authorization": f"Bearer {self.access_token}"},
+            )
+        return self._client
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc or urlsplit(self.base_url).netloc
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_slots[host]
+
+    def _retry_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        return min(self.backoff * (2 ** attempt) + random.uniform(0, self.backoff), self.max_backoff)
+
+    async def request(self, method, url, **kwargs):
+        """Send a request, backing off on 429/5xx (429 only for POST) and connection failures."""
+        retry_statuses = POST_RETRY_STATUSES if method == "POST" else RETRY_STATUSES
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                async with self._host_slot(url):
+                    response = await self.client.request(method, url, **kwargs)
+            except Exception as e:
+                observe_http("graph", method, "error", time.perf_counter() - started)
+                if not isinstance(e, RETRY_ERRORS) or attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                logging.warning(f"Graph API {method} {url} failed ({e}), retrying in {delay:.2f}s")
+            else:
+                observe_http("graph", method, response.status_code, time.perf_counter() - started)
+                if response.status_code not in retry_statuses or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_delay(attempt, response)
+                if delay > self.max_backoff:
+                    logging.warning(
+                        f"Graph API {method} {url} returned {response.status_code} with Retry-After {delay:.0f}s, "
+                        f"longer than GRAPH_MAX_BACKOFF; not retrying"
+                    )
+                    return response
+                logging.warning(
+                    f"Graph API {method} {url} returned {response.status_code}, retrying in {delay:.2f}s"
+                )
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+graph_client = GraphClient()
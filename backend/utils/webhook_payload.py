@@ -0,0 +1,23 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def parse_body(raw):
+    """Parse a webhook body from raw bytes (orjson when installed)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def is_status_only(raw):
+    """Cheap check on the raw bytes for deliveries carrying only sent/delivered/read statuses.
+
+    Keys appear unescaped in the JSON while quotes inside message text are escaped
+    as \\", so these substrings can only match object keys. A batch that has any
+    message is never classified as status-only.
+    """
+    return b'"statuses"' in raw and b'"messages"' not in raw
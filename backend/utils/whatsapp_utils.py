@@ -1,14 +1,20 @@
+import asyncio
 import logging
 import json
-import requests
+import httpx
 import re
 from dotenv import load_dotenv
 from fastapi.responses import JSONResponse
 import os
 import sys
 import logging
-from services.dashscope_service import generate_response
-from services.speech_recognition import transcribe_audio, transcribe_audio_ar
+from services.dashscope_service import generate_response, prefetch_context
+from utils.graph_client import graph_client
+from services.transcription import transcriber
+from services.media_cache import media_cache
+from services.asr_engines import ASR_LANGUAGE
+from services.pubsub import broker, conversation_topic
+from services.metrics import stage
 
 load_dotenv()
 
@@ -28,15 +34,10 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../serv
 
 
 
-SAVE_DIR = "audio_files/"  # Directory to save audio files
-
-def download_audio_save(media_id):
-    """Fetch audio URL and save the file locally."""
-    url = f"https://graph.facebook.com/{VERSION}/{media_id}"
-    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
-
+async def fetch_media_content(media_id):
+    """Resolve a media id to its download URL and fetch the raw bytes."""
     # Get the direct download URL
-    response = requests.get(url, headers=headers)
+    response = await graph_client.get(f"/{VERSION}/{media_id}")
     if response.status_code != 200:
         logging.error(f"Failed to get audio URL: {response.text}")
         return None
@@ -47,57 +48,77 @@ def download_audio_save(media_id):
         return None
 
     # Download the audio file
-    audio_response = requests.get(download_url, headers=headers)
+    audio_response = await graph_client.get(download_url)
     if audio_response.status_code == 200:
-        os.makedirs(SAVE_DIR, exist_ok=True)
-        file_path = os.path.join(SAVE_DIR, f"{media_id}.ogg")
-
-        with open(file_path, "wb") as f:
-            f.write(audio_response.content)
-        
-        logging.info(f"Audio saved: {file_path}")
-        return file_path
+        return audio_response.content
     else:
         logging.error(f"Failed to download audio: {audio_response.text}")
         return None
 
 
+async def cached_media(media_id):
+    """Return (sha256, bytes) of a media id, downloading it only on a cache miss."""
+    digest = await asyncio.to_thread(media_cache.lookup, media_id)
+    if digest is not None:
+        content = await asyncio.to_thread(media_cache.get_audio, digest)
+        if content is not None:
+            return digest, content
 
+    content = await fetch_media_content(media_id)
+    if content is None:
+        return None, None
+    digest = await asyncio.to_thread(media_cache.put_audio, media_id, content)
+    return digest, content
 
-def download_audio(media_id):
-    """Fetch audio URL and return the raw audio content."""
-    url = f"https://graph.facebook.com/{VERSION}/{media_id}"
-    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
 
-    # Get the direct download URL
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        logging.error(f"Failed to get audio URL: {response.text}")
+async def download_audio_save(media_id):
+    """Fetch audio into the media cache and return its path."""
+    digest, content = await cached_media(media_id)
+    if content is None:
         return None
 
-    download_url = response.json().get("url")
-    if not download_url:
-        logging.error("No download URL found.")
-        return None
+    file_path = media_cache.path(digest)
+    logging.info(f"Audio saved: {file_path}")
+    return file_path
 
-    # Download the audio file
-    audio_response = requests.get(download_url, headers=headers)
-    if audio_response.status_code == 200:
+
+
+
+async def download_audio(media_id):
+    """Fetch audio URL and return the raw audio content."""
+    _, content = await cached_media(media_id)
+    if content is not None:
         logging.info("Audio downloaded successfully.")
-        return audio_response.content  # Return raw audio content as bytes
-    else:
-        logging.error(f"Failed to download audio: {audio_response.text}")
-        return None
-    
-def fetch_and_transcribe(media_id):
-    """Fetch audio and transcribe it without saving to disk."""
-    # Download the raw audio content
-    audio_data = download_audio(media_id)
+    return content  # Return raw audio content as bytes
+
+
+# Transcriptions in progress by media id, so redeliveries wait for the same result
+_transcriptions = {}
+
+async def fetch_and_transcribe(media_id, on_segment=None):
+    """Fetch audio and transcribe it, reusing cached audio and transcripts."""
+    task = _transcriptions.get(media_id)
+    if task is None:
+        task = asyncio.create_task(_fetch_and_transcribe(media_id, on_segment))
+        _transcriptions[media_id] = task
+        task.add_done_callback(lambda _: _transcriptions.pop(media_id, None))
+    # Shielded: one cancelled caller must not cancel the transcription for the others
+    return await asyncio.shield(task)
+
+async def _fetch_and_transcribe(media_id, on_segment):
+    digest, audio_data = await cached_media(media_id)
     if not audio_data:
         raise ValueError("Failed to download audio.")
 
-    # Transcribe the audio
-    transcription = transcribe_audio(audio_data)
+    # Redelivered or forwarded audio was already transcribed
+    transcription = await asyncio.to_thread(media_cache.get_transcript, digest, ASR_LANGUAGE)
+    if transcription is not None:
+        logging.info(f"Transcript for {media_id} served from the media cache")
+        return transcription
+
+    # Decode, split and transcribe the segments concurrently in the audio worker pool
+    transcription = await transcriber.transcribe(audio_data, on_segment=on_segment)
+    await asyncio.to_thread(media_cache.put_transcript, digest, ASR_LANGUAGE, transcription)
     return transcription
 
 def log_http_response(response):
@@ -119,24 +140,24 @@ def get_text_message_input(recipient, text):
 
 
 
-def send_message(data):
+async def send_message(data):
     headers = {
         "Content-type": "application/json",
-        "Authorization": f"Bearer {ACCESS_TOKEN}",
     }
 
-    url = f"https://graph.facebook.com/{VERSION}/{PHONE_NUMBER_ID}/messages"
+    url = f"/{VERSION}/{PHONE_NUMBER_ID}/messages"
 
     try:
-        response = requests.post(
-            url, data=data, headers=headers, timeout=10
-        )  # 10 seconds timeout as an example
-        response.raise_for_status()  # Raises an HTTPError if the HTTP request returned an unsuccessful status code
-    except requests.Timeout:
+        with stage("send"):
+            response = await graph_client.post(
+                url, content=data, headers=headers
+            )  # timeouts, pooling and retries are configured on the shared client
+        response.raise_for_status()  # Raises an HTTPStatusError if the HTTP request returned an unsuccessful status code
+    except httpx.TimeoutException:
         logging.error("Timeout occurred while sending message")
         return JSONResponse({"status": "error", "message": "Request timed out"}, status_code=408)
     except (
-        requests.RequestException
+        httpx.HTTPError
     ) as e:  # This will catch any general request exception
         logging.error(f"Request failed due to: {e}")
         return JSONResponse({"status": "error", "message": "Failed to send message"}, status_code=500)
@@ -165,18 +186,31 @@ def process_text_for_whatsapp(text):
 
 
 
+def iter_webhook_messages(body):
+    """
+    Yield (message, name) for every message of every entry and change in a webhook delivery.
+
+    `name` is the WhatsApp profile name of the message's sender, or "" if not provided.
+    """
+    if not isinstance(body, dict) or not body.get("object"):
+        return
+    for entry in body.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            names = {
+                contact.get("wa_id"): contact.get("profile", {}).get("name", "")
+                for contact in value.get("contacts") or []
+            }
+            for message in value.get("messages") or []:
+                if message:
+                    yield message, names.get(message.get("from"), "")
+
+
 def is_valid_whatsapp_message(body):
     """
-    Check if the incoming webhook event has a valid WhatsApp message structure.
+    Check if the incoming webhook event contains at least one WhatsApp message.
     """
-    return (
-        body.get("object")
-        and body.get("entry")
-        and body["entry"][0].get("changes")
-        and body["entry"][0]["changes"][0].get("value")
-        and body["entry"][0]["changes"][0]["value"].get("messages")
-        and body["entry"][0]["changes"][0]["value"]["messages"][0]
-    )
+    return next(iter_webhook_messages(body), None) is not None
 
 
 
@@ -185,49 +219,66 @@ def is_valid_whatsapp_message(body):
 # In-memory storage to track registration states (Ideally, use a database)
 USER_REGISTRATION_STATE = {}
 
-def process_whatsapp_message(body):
-    wa_id = body["entry"][0]["changes"][0]["value"]["contacts"][0]["wa_id"]
-    name = body["entry"][0]["changes"][0]["value"]["contacts"][0]["profile"]["name"]
-    
-    message = body["entry"][0]["changes"][0]["value"]["messages"][0]
+async def process_whatsapp_message(message, name):
+    """Answer one message taken from a webhook delivery (see iter_webhook_messages)."""
+    wa_id = message["from"]
     message_body_type = message["type"]
 
-    return handle_existing_user(message_body_type, message, wa_id, name)
+    return await handle_existing_user(message_body_type, message, wa_id, name)
 
 
-def handle_existing_user(message_body_type, message, wa_id, name):
+async def handle_existing_user(message_body_type, message, wa_id, name):
     """Handles messages from registered users."""
     
     if message_body_type == "text":
         message_body = message["text"]["body"]
-        response = generate_response(message_body, wa_id, name)
+        with stage("generate"):
+            response = await generate_response(message_body, wa_id, name)
         response = process_text_for_whatsapp(response)
-        send_message(get_text_message_input(wa_id, response))
+        await send_message(get_text_message_input(wa_id, response))
         return message_body, response
 
     elif message_body_type == "audio":
         audio_id = message["audio"]["id"]
         mime_type = message["audio"]["mime_type"]
         logging.info(f"Received voice message - ID: {audio_id}, MIME: {mime_type}")
+
+        def report_segment(index, total, text, seconds):
+            broker.publish(conversation_topic(wa_id), {
+                "type": "transcription", "media_id": audio_id,
+                "segment": index + 1, "segments": total, "text": text, "seconds": round(seconds, 3),
+            })
+
+        # Load the conversation context while the note is being transcribed
+        prefetch = asyncio.create_task(prefetch_context(wa_id))
         try:
-            text_transcribe = fetch_and_transcribe(audio_id)
+            try:
+                with stage("transcribe"):
+                    text_transcribe = await fetch_and_transcribe(audio_id, on_segment=report_segment)
+            except ValueError as e:
+                # Download or recognition failed: ask for the note again. A full audio pool
+                # or a timeout propagates instead, so the job queue or Meta retries it.
+                logging.warning(f"Transcription failed: {e!r}")
+                response = "I couldn't understand your audio. Please record it again."
+                await send_message(get_text_message_input(wa_id, response))
+                return "[audio: not transcribed]", response
             if text_transcribe:
                 logging.info(f"The transcription is : {text_transcribe}")
-            response = generate_response(text_transcribe, wa_id, name)
+            await prefetch
+            with stage("generate"):
+                response = await generate_response(text_transcribe, wa_id, name)
             response = process_text_for_whatsapp(response)
-            send_message(get_text_message_input(wa_id, response))
+            await send_message(get_text_message_input(wa_id, response))
             return text_transcribe, response
-        except ValueError as e:
-            logging.warning(f"Transcription failed: {e}")
-            response = "I couldn't understand your audio. Please record it again."
-            send_message(get_text_message_input(wa_id, response))
-            return e , response
+        finally:
+            # No-op once the prefetch finished; otherwise don't leave it running
+            prefetch.cancel()
 
 
-def send_message_to_admin( response, wa_id):
+async def send_message_to_admin( response, wa_id):
     """Handles messages from registered users."""
 
     data = get_text_message_input(wa_id, response)
-    return  send_message(data)
+    return await send_message(data)
 
 
@@ -1,37 +1,89 @@
+import os
+import time
 import streamlit as st
 from streamlit_autorefresh import st_autorefresh
 from utils.headers import (
     fetch_contacts,
-    fetch_conversation,
+    invalidate_contacts,
+    sync_conversation,
+    apply_live_messages,
     toggle_human_chat,
     send_user_message,
+    request_timings,
 )
+from utils.live import LiveUpdates
 
 POLLING_INTERVAL = 5000  # milliseconds
+LIVE_UPDATES = os.getenv("LIVE_UPDATES", "0") == "1"  # push new messages over SSE instead of polling
+LIVE_REFRESH_INTERVAL = 1000  # milliseconds; reruns only redraw from the session cache
+
+
+def live_conversation(wa_id):
+    """Conversation kept current by the SSE listener, polling while it is disconnected."""
+    listener = st.session_state.get("live_listener")
+    if listener is None or listener.wa_id != wa_id or not listener.is_alive():
+        if listener is not None:
+            listener.stop()
+        conversation = sync_conversation(wa_id)
+        st.session_state["last_sync"] = time.monotonic()
+        listener = LiveUpdates(wa_id, conversation[-1]["id"] if conversation else None)
+        listener.start()
+        st.session_state["live_listener"] = listener
+        return conversation
+
+    events = listener.drain()
+    for event in events:
+        if event["type"] == "contact":
+            st.session_state.setdefault("contact_state", {})[event["PHONE_NUMBER"]] = event
+            if event.get("CREATED"):
+                invalidate_contacts()
+    conversation = apply_live_messages(wa_id, [e for e in events if e["type"] == "message"])
+    # Reruns come every LIVE_REFRESH_INTERVAL; fall back to polling at POLLING_INTERVAL only
+    now = time.monotonic()
+    if not listener.connected and now - st.session_state.get("last_sync", 0) >= POLLING_INTERVAL / 1000:
+        conversation = sync_conversation(wa_id)
+        st.session_state["last_sync"] = now
+    return conversation
+
 
 def main():
     st.sidebar.title("👋 TalkTracer App")
 
     # 1) Auto-refresh every POLLING_INTERVAL ms
     #    This reruns the script automatically.
-    st_autorefresh(interval=POLLING_INTERVAL, key="chat_refresh")
+    st_autorefresh(interval=LIVE_REFRESH_INTERVAL if LIVE_UPDATES else POLLING_INTERVAL, key="chat_refresh")
 
     # 2) Choose your contact and human-chat toggle
     wa_id = st.sidebar.selectbox("Choose your customer:", fetch_contacts())
     human_access = st.sidebar.checkbox("Activate Human Chat", False)
 
-    # 3) Push toggle immediately on change
-    toggle_human_chat(wa_id, human_access)
+    # 3) Push toggle only when it differs from what we last sent for this contact
+    sent_toggles = st.session_state.setdefault("sent_toggles", {})
+    if wa_id and sent_toggles.get(wa_id) != human_access:
+        if toggle_human_chat(wa_id, human_access) is not None:
+            sent_toggles[wa_id] = human_access
+
+    # 4) Fetch only the messages we haven't seen yet for this wa_id
+    if not wa_id:
+        conversation = []
+    elif LIVE_UPDATES:
+        conversation = live_conversation(wa_id)
+    else:
+        conversation = sync_conversation(wa_id)
 
-    # 4) Fetch *fresh* conversation for this wa_id
-    conversation = fetch_conversation(wa_id) or []
+    contact_state = st.session_state.get("contact_state", {}).get(wa_id)
+    if contact_state:
+        st.sidebar.caption("Handled by a human" if contact_state["AI_ACTIVE"] == 0 else "Handled by the AI")
 
-    # 5) Render every message straight from the backend
+    # 5) Render the cached conversation
     for msg in conversation:
         role = "user" if msg["SENDER"] == wa_id else "assistant"
         with st.chat_message(role):
             st.markdown(msg["MESSAGE"])
 
+    with st.sidebar.expander("Backend requests"):
+        st.dataframe(request_timings(), hide_index=True, use_container_width=True)
+
     # 6) If human chat is on, show input box
     if human_access:
         user_input = st.chat_input("Type your message here…")
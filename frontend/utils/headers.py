@@ -1,45 +1,143 @@
 
+import time
+from collections import deque
+
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 API_URL_HISTORY = "http://backend:8080/history"
+API_URL_UPDATES = "http://backend:8080/history/updates"
 API_URL_SENDING = "http://backend:8080/sending"
 API_URL_HUMAN = "http://backend:8080/toggle-human-chat" 
 API_CONTACTS_URL = "http://backend:8080/contacts" 
+HISTORY_PAGE_SIZE = 200  # newest messages shown per conversation
+HISTORY_CACHE_SIZE = 1000  # messages kept per conversation in the session cache
+
+REQUEST_TIMEOUT = (3.05, 10)  # connect, read seconds
+CONTACTS_TTL = 30  # seconds the contact list is shared between reruns and operators
+HISTORY_PAGE_TTL = 60  # seconds a conversation page is shared between operators
+TIMINGS_KEPT = 20  # recent requests shown in the sidebar
+
+
+@st.cache_resource
+def get_session():
+    """Keep-alive session shared by every script run, with retries on idempotent requests."""
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def backend_request(method, url, **kwargs):
+    """Send a request through the shared session and record its timing for the sidebar."""
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    started = time.perf_counter()
+    status = "error"
+    try:
+        response = get_session().request(method, url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        timings = st.session_state.setdefault("request_timings", deque(maxlen=TIMINGS_KEPT))
+        timings.append({
+            "request": f"{method} {url.rsplit('/', 1)[-1]}",
+            "status": status,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+
+_contacts_validator = {"etag": None, "contacts": []}
+
+
+@st.cache_data(ttl=CONTACTS_TTL, show_spinner=False)
+def load_contacts():
+    headers = {"If-None-Match": _contacts_validator["etag"]} if _contacts_validator["etag"] else {}
+    response = backend_request("GET", API_CONTACTS_URL, headers=headers)
+    if response.status_code == 304:
+        return _contacts_validator["contacts"]
+    response.raise_for_status()
+    _contacts_validator["contacts"] = response.json()
+    _contacts_validator["etag"] = response.headers.get("ETag")
+    return _contacts_validator["contacts"]
+
+
+def invalidate_contacts():
+    """Drop the cached contact list so the next fetch_contacts() includes new contacts."""
+    load_contacts.clear()
 
 
 def fetch_contacts():
+    """Contact list, cached for CONTACTS_TTL seconds and revalidated with the backend's ETag."""
     try:
-        response = requests.get(API_CONTACTS_URL)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Error {response.status_code}: {response.json().get('detail')}")
+        return load_contacts()
     except Exception as e:
         st.error(f"Request failed: {e}")
-    return []
+    return _contacts_validator["contacts"]
 
 
+@st.cache_data(ttl=HISTORY_PAGE_TTL, show_spinner=False)
+def load_conversation_page(wa_id, before=None, limit=HISTORY_PAGE_SIZE):
+    params = {"user_id": wa_id, "limit": limit}
+    if before is not None:
+        params["before"] = before
+    response = backend_request("POST", API_URL_HISTORY, params=params)
+    if response.status_code == 404:
+        return []
+    response.raise_for_status()
+    return response.json()
 
 
+def fetch_conversation(wa_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """A page of the conversation (the newest, or the one older than message id `before`)."""
+    try:
+        return load_conversation_page(wa_id, before, limit)
+    except Exception as e:
+        st.error(f"Request failed: {e}")
+    return []
 
+def sync_conversation(wa_id):
+    """Fetch only messages newer than the session's cached ones and return the cached conversation."""
+    conversations = st.session_state.setdefault("conversations", {})
+    cache = conversations.setdefault(wa_id, {"etag": None, "messages": []})
 
+    if not cache["messages"]:
+        # First view: start from the page shared with other operators
+        cache["messages"] = list(fetch_conversation(wa_id))
 
-def fetch_conversation(wa_id):
+    params = {"user_id": wa_id, "limit": HISTORY_PAGE_SIZE}
+    if cache["messages"]:
+        params["after"] = cache["messages"][-1]["id"]
+    headers = {"If-None-Match": cache["etag"]} if cache["etag"] else {}
     try:
-        response = requests.post(f"{API_URL_HISTORY}?user_id={wa_id}")
+        response = backend_request("GET", API_URL_UPDATES, params=params, headers=headers)
         if response.status_code == 200:
-            return response.json()
-        else:
+            new_messages = response.json()
+            cache["messages"] = (cache["messages"] + new_messages)[-HISTORY_CACHE_SIZE:]
+            # A full page may not reach the newest message yet; revalidate next time
+            cache["etag"] = response.headers.get("ETag") if len(new_messages) < HISTORY_PAGE_SIZE else None
+        elif response.status_code != 304:
             st.error(f"Error {response.status_code}: {response.json().get('detail')}")
     except Exception as e:
         st.error(f"Request failed: {e}")
-    return []
+    return cache["messages"]
+
+def apply_live_messages(wa_id, messages):
+    """Append pushed messages to the session cache, skipping ones already synced."""
+    conversations = st.session_state.setdefault("conversations", {})
+    cache = conversations.setdefault(wa_id, {"etag": None, "messages": []})
+    last_id = cache["messages"][-1]["id"] if cache["messages"] else 0
+    new_messages = [m for m in messages if m["id"] > last_id]
+    cache["messages"] = (cache["messages"] + new_messages)[-HISTORY_CACHE_SIZE:]
+    return cache["messages"]
 
 def toggle_human_chat(wa_id, activate):
     payload = {"wa_id": wa_id, "activate": activate}
     try:
-        response = requests.post(API_URL_HUMAN, json=payload)
+        response = backend_request("POST", API_URL_HUMAN, json=payload)
         if response.status_code == 200:
             return response.json().get("message")
         else:
@@ -51,10 +149,20 @@ def toggle_human_chat(wa_id, activate):
 def send_user_message(wa_id, message):
     payload = {"wa_id": wa_id, "message": message}
     try:
-        response = requests.post(API_URL_SENDING, json=payload)
-        return response.status_code == 200
+        response = backend_request("POST", API_URL_SENDING, json=payload)
+        if response.status_code == 200:
+            # The conversation changed: drop shared pages and revalidate this session's copy
+            load_conversation_page.clear()
+            cache = st.session_state.get("conversations", {}).get(wa_id)
+            if cache is not None:
+                cache["etag"] = None
+            return True
+        return False
     except Exception as e:
         st.error(f"Error sending message: {e}")
     return False
-    
-       
\ No newline at end of file
+
+
+def request_timings():
+    """Most recent backend requests of this session, newest first."""
+    return list(reversed(st.session_state.get("request_timings", [])))
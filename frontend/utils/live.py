@@ -0,0 +1,73 @@
+import json
+import logging
+import queue
+import threading
+
+import requests
+
+API_URL_EVENTS = "http://backend:8080/events"
+RECONNECT_DELAY = 2  # seconds between reconnect attempts
+
+
+class LiveUpdates(threading.Thread):
+    """Background SSE consumer for one conversation.
+
+    Streamlit widgets can't be touched from other threads, so events are only
+    queued here and drained by the script on its next run.
+    """
+
+    def __init__(self, wa_id, last_event_id=None):
+        super().__init__(daemon=True)
+        self.wa_id = wa_id
+        self.last_event_id = last_event_id
+        self.events = queue.Queue()
+        self.connected = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            headers = {"Accept": "text/event-stream"}
+            if self.last_event_id is not None:
+                headers["Last-Event-ID"] = str(self.last_event_id)
+            try:
+                with requests.get(API_URL_EVENTS, params={"wa_id": self.wa_id}, headers=headers,
+                                  stream=True, timeout=(5, 60)) as response:
+                    response.raise_for_status()
+                    self.connected = True
+                    self._read_events(response)
+            except requests.RequestException:
+                pass
+            except Exception:
+                # e.g. a malformed event; reconnect instead of letting the listener die
+                logging.exception("Live updates listener failed, reconnecting")
+            self.connected = False
+            self._stop_event.wait(RECONNECT_DELAY)
+
+    def _read_events(self, response):
+        data = []
+        for line in response.iter_lines(decode_unicode=True):
+            if self._stop_event.is_set():
+                return
+            if line is None:
+                continue
+            if line == "":
+                if data:
+                    event = json.loads("\n".join(data))
+                    if event.get("type") == "message":
+                        self.last_event_id = event["id"]
+                    self.events.put(event)
+                data = []
+            elif line.startswith("data:"):
+                data.append(line[5:].lstrip())
+
+    def drain(self):
+        """Return all events received since the last call."""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def stop(self):
+        self._stop_event.set()